@@ -0,0 +1,131 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+
+import config
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(config.DOWNLOAD_BUFFER_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class ArtifactCache:
+    """On-disk store of each stage's output, keyed by (PDF sha256, stage, stage version).
+
+    Least recently used entries are evicted once the total passes max_bytes.
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or config.ARTIFACT_CACHE_DIR
+        self.max_bytes = config.ARTIFACT_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    key TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_last_used ON artifacts (last_used)")
+
+    @staticmethod
+    def _key(digest, stage, version):
+        return hashlib.sha256(f"{digest}\0{stage}\0{version}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".pkl")
+
+    def get(self, digest, stage, version, default=None):
+        """The stored value, or default when there is none (or it can no longer be read)."""
+        key = self._key(digest, stage, version)
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM artifacts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        try:
+            with open(self._path(key), "rb") as f:
+                value = pickle.load(f)
+        except Exception as e:
+            logging.warning(f" Dropping unreadable cached {stage} for {digest[:12]}: {e}")
+            self._remove(key)
+            return default
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE artifacts SET last_used = ? WHERE key = ?", (time.time(), key))
+        return value
+
+    def put(self, digest, stage, version, value):
+        key = self._key(digest, stage, version)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.max_bytes and len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so another process never reads half a file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO artifacts (key, digest, stage, version, size, last_used) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET size = excluded.size, last_used = excluded.last_used
+            """, (key, digest, stage, str(version), len(data), time.time()))
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used artifacts until the cache fits in max_bytes."""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, size in self._conn.execute("SELECT key, size FROM artifacts ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+        for key in victims:
+            self._remove(key)
+
+    def _remove(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """The cache for this process, opened on first use; None when it is turned off (or in diskless mode)."""
+    global _cache
+    if config.ARTIFACT_CACHE_MAX_MB <= 0 or config.DISKLESS_MODE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArtifactCache()
+        return _cache
@@ -0,0 +1,84 @@
+"""Time the PyMuPDF classifier against the two it replaced: python bench_classifier.py "Sample Reports" --runs 5"""
+import os
+import glob
+import time
+import argparse
+import statistics
+
+import fitz
+import pdfplumber
+
+import pdf_classifier
+from pdf_document import PdfDocument
+
+
+def legacy_tables(file_path, max_pages=3):
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages[:max_pages]:
+            tables = page.extract_tables()
+            if tables and any(any(row) for table in tables for row in table):
+                return 'table'
+    with fitz.open(file_path) as doc:
+        for page in doc[:max_pages]:
+            if len(page.get_text().strip()) > 100:
+                return 'text'
+    return 'unknown'
+
+
+def legacy_layout(file_path, pages=2):
+    content = ""
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages[:pages]:
+            content += (page.extract_text() or "").lower()
+    scores = sorted(((sum(1 for kw in kws if kw.lower() in content), label)
+                     for label, kws in pdf_classifier.DEFAULT_KEYWORDS.items()), reverse=True)
+    if scores[0][0] == 0 or scores[0][0] == scores[1][0]:
+        return 'unknown'
+    return scores[0][1]
+
+
+def engine_cold(file_path):
+    pdf_classifier._cache.clear()
+    with PdfDocument(file_path) as doc:
+        return pdf_classifier.classify(doc).label
+
+
+def engine_cached(file_path):
+    with PdfDocument(file_path) as doc:
+        return pdf_classifier.classify(doc).label
+
+
+CLASSIFIERS = {"tables": legacy_tables, "layout": legacy_layout, "engine": engine_cold, "engine (cached)": engine_cached}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF classifiers")
+    parser.add_argument("folder", help="folder of sample PDFs")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(args.folder, "*.pdf")))
+    if not pdfs:
+        raise SystemExit(f"No PDF files found in {args.folder}")
+
+    timings = {name: [] for name in CLASSIFIERS}
+    labels = {name: {} for name in CLASSIFIERS}
+    for pdf in pdfs:
+        for name, classify in CLASSIFIERS.items():
+            runs = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                labels[name][pdf] = classify(pdf)
+                runs.append(time.perf_counter() - start)
+            timings[name].append(statistics.median(runs))
+
+    reference = labels["engine"]
+    print(f"{len(pdfs)} PDF(s), median of {args.runs} run(s) per file")
+    for name in CLASSIFIERS:
+        agree = sum(1 for pdf in pdfs if labels[name][pdf] == reference[pdf])
+        print(f"{name:>16}: {statistics.median(timings[name]) * 1000:8.1f} ms/file median, "
+              f"{sum(timings[name]) * 1000:9.1f} ms total, agrees with engine on {agree}/{len(pdfs)}")
+
+
+if __name__ == "__main__":
+    main()
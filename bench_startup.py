@@ -0,0 +1,78 @@
+"""Median start-up time of the monitor: python bench_startup.py --runs 5 [--sample file.pdf] [--exe dist/main/main.exe]"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import threading
+
+import config
+
+MARKERS = {
+    "first poll": re.compile(r"Startup: first poll done after ([\d.]+)s"),
+    "first file": re.compile(r"Startup: first file processed after ([\d.]+)s"),
+}
+
+
+def run_once(command, sample=None, timeout=300):
+    """Start the monitor, wait for the markers (or the timeout), stop it; returns {marker: seconds}."""
+    wanted = set(MARKERS) if sample else {"first poll"}
+    timings = {}
+    done = threading.Event()
+    started = time.perf_counter()
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace")
+
+    def read_log():
+        for line in proc.stdout:
+            for name, pattern in MARKERS.items():
+                match = pattern.search(line)
+                if match and name not in timings:
+                    # The monitor's own figure starts after the interpreter is up; the wall time includes it
+                    timings[name] = (float(match.group(1)), time.perf_counter() - started)
+            if wanted <= set(timings):
+                done.set()
+        done.set()
+
+    reader = threading.Thread(target=read_log, daemon=True)
+    reader.start()
+    if sample:
+        os.makedirs(config.LOCAL_FILES_TO_PROCESS, exist_ok=True)
+        shutil.copy2(sample, os.path.join(config.LOCAL_FILES_TO_PROCESS, f"bench_{int(time.time())}_{os.path.basename(sample)}"))
+    done.wait(timeout)
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure monitor start-up time")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--exe", help="built monitor to run instead of main.py")
+    parser.add_argument("--sample", help="PDF copied into the local input folder on each run")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    command = [args.exe] if args.exe else [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")]
+    results = {name: [] for name in MARKERS}
+    for run in range(1, args.runs + 1):
+        timings = run_once(command, args.sample, args.timeout)
+        for name, value in timings.items():
+            results[name].append(value)
+        summary = ", ".join(f"{name} {wall:.2f}s" for name, (_, wall) in timings.items()) or "no markers seen"
+        print(f"Run {run}: {summary}")
+
+    for name, values in results.items():
+        if values:
+            in_process = statistics.median(v[0] for v in values)
+            wall = statistics.median(v[1] for v in values)
+            print(f"{name}: median {wall:.2f}s wall ({in_process:.2f}s after imports) over {len(values)} run(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Lines per second of text_extract cleaning, old regexes vs learned headers: python bench_text_extract.py report.pdf"""
+import re
+import time
+import argparse
+import statistics
+
+import text_extract
+from pdf_document import PdfDocument
+
+
+def regex_clean(pages):
+    kept = []
+    for text in pages:
+        for ln in text.split('\n'):
+            line = ln.strip()
+            for pat in text_extract.compiled_footers:
+                line = pat.sub('', line)
+            for frag in text_extract.footer_fragments:
+                line = line.replace(frag, '')
+            line = re.sub(r'\s{2,}', ' ', line).strip()
+            if line:
+                kept.append(line)
+    return kept
+
+
+def learned_clean(pages):
+    furniture = text_extract.HeaderFooterFilter()
+    return [line for text in pages for line in furniture.clean_page(text)]
+
+
+def timed(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text_extract line cleaning")
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for pdf in args.pdfs:
+        with PdfDocument(pdf) as doc:
+            pages = [doc.text(i) for i in range(doc.page_count)]
+            lines = sum(text.count('\n') + 1 for text in pages)
+            regex_time, regex_lines = timed(lambda: regex_clean(pages), args.runs)
+            learned_time, learned_lines = timed(lambda: learned_clean(pages), args.runs)
+            extract_time, rows = timed(lambda: text_extract.extract_pdf(doc), args.runs)
+        print(f"{doc.name}: {len(pages)} pages, {lines} lines")
+        print(f"  regex:   {lines / regex_time:12,.0f} lines/s")
+        print(f"  learned: {lines / learned_time:12,.0f} lines/s ({regex_time / learned_time:.1f}x), "
+              f"{'same' if learned_lines == regex_lines else 'DIFFERENT'} lines kept")
+        print(f"  extract: {lines / extract_time:12,.0f} lines/s, {len(rows)} rows")
+
+
+if __name__ == "__main__":
+    main()
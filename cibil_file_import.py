@@ -1,27 +1,30 @@
 import os
 import re
 import csv
-import requests
+import contextlib
 import pandas as pd
-from urllib.parse import quote
+from onedrive_utils import get_drive_id, invalidate_drive_id, put_file
 #from main import get_auth_headers, USER_ID  
 
+# Version of the output sheet built from the extracted rows; raise it after changing FIELD_MAPPING or the parsing below
+STAGE_VERSION = 1
+
 
 def get_user_drive_id(headers, user_email):
-    url = f"https://graph.microsoft.com/v1.0/users/{user_email}/drive"
-    resp = requests.get(url, headers=headers)
-    resp.raise_for_status()
-    return resp.json().get('id')
+    return get_drive_id(headers, user_email)
 
 def upload_file_to_onedrive(headers, user_email, local_file_path, remote_folder): 
-    drive_id = get_user_drive_id(headers, user_email)
     filename = os.path.basename(local_file_path)
-    remote_path_encoded = quote(f"{remote_folder}/{filename}")
-    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{remote_path_encoded}:/content"
 
-    with open(local_file_path, 'rb') as f:
-        resp = requests.put(url, headers=headers, data=f)
+    for attempt in range(2):
+        drive_id = get_user_drive_id(headers, user_email)
+        drive_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}"
+        resp = put_file(headers, drive_url, f"{remote_folder}/{filename}", local_file_path)
+        if resp.status_code == 404 and attempt == 0:
+            invalidate_drive_id(user_email)  # cached drive id no longer valid
+            continue
         resp.raise_for_status()
+        break
     print(f"Uploaded {filename} to OneDrive folder '{remote_folder}'")
     #print("\n")
 def process_local_files(headers=None, user_email=None, local_input_dir=None, local_export_dir=None, onedrive_export_folder=None,only_file=None):
@@ -29,8 +32,9 @@ def process_local_files(headers=None, user_email=None, local_input_dir=None, loc
     files =[only_file] if only_file else [f for f in os.listdir(local_input_dir) if f.lower().endswith('.csv')]
     if not files:
         print(f"No CSV files found in {local_input_dir}")
-        return
+        return []
 
+    outputs = []
     for filename in files:
         source_file = os.path.join(local_input_dir, filename)
         try:
@@ -45,7 +49,7 @@ def process_local_files(headers=None, user_email=None, local_input_dir=None, loc
                 df.to_excel(output_file, index=False, engine='openpyxl')
 
             append_data_to_ods(extracted_data, max_len, output_file)
-
+            outputs.append(output_file)
 
             if headers and user_email and onedrive_export_folder: 
                 upload_file_to_onedrive(headers, user_email, output_file, onedrive_export_folder) # for local path
@@ -55,6 +59,8 @@ def process_local_files(headers=None, user_email=None, local_input_dir=None, loc
         except Exception as e:
             print(f"Error processing {source_file}: {e}")
 
+    return outputs
+
 # Mapping keys between source and destination files
 FIELD_MAPPING = {
     'Name': 'Entity Name/ Director Name',
@@ -74,21 +80,26 @@ FIELD_MAPPING = {
 
 
 # Extraction dictionary for Written Off and Settled values
+# source_file may also be an open text file object
 def extract_data_from_csv(source_file):
+    # Read source CSV into rows
+    if hasattr(source_file, "read"):
+        csv_file = contextlib.nullcontext(source_file)
+    else:
+        csv_file = open(source_file, 'r', encoding='utf-8-sig', errors='ignore')
+    with csv_file as f:  
+        rows = list(csv.reader(f))
+    return extract_data_from_rows(rows)
+
+# Same as extract_data_from_csv, from cibil_pdf_extract.extract_table_rows() records instead of their CSV
+def extract_data_from_records(records):
+    return extract_data_from_rows([record.cells for record in records])
+
+def extract_data_from_rows(rows):
     extracted_data = {key: [] for key in FIELD_MAPPING.keys()}
     extracted_data['Written Off'] = []
     extracted_data['Settled'] = []
-    lines = []
-    rows = []
-    
-    # Read source CSV into lines and rows
-    with open(source_file, 'r', encoding='utf-8-sig', errors='ignore') as f:  
-        reader = csv.reader(f)
-        for row in reader:
-            rows.append(row)
-            for val in row:
-                if val:
-                    lines.append(val.strip())
+    lines = [val.strip() for row in rows for val in row if val]
     # Extract Rank value separately
     for row in rows:
         for i, cell in enumerate(row):
@@ -232,8 +243,13 @@ def normalize_val(v):
         return v
     return v
 
+# destination_file may also be a writable binary file object with a .name; new files are filled from the empty template
 def append_data_to_ods(extracted_data, max_len, destination_file):
-    df = read_spreadsheet(destination_file)
+    in_memory = hasattr(destination_file, "write")
+    if in_memory or not os.path.exists(destination_file):
+        df = pd.DataFrame(columns=FIELD_MAPPING.values())
+    else:
+        df = read_spreadsheet(destination_file)
     df.columns = [str(col).strip().lstrip('\ufeff') for col in df.columns]
     # Build output rows combining Written Off and Settled into one field
     append_rows = []
@@ -265,7 +281,7 @@ def append_data_to_ods(extracted_data, max_len, destination_file):
     append_df = append_df[df.columns]
     
     # Save based on file extension
-    ext = os.path.splitext(destination_file)[1].lower()
+    ext = os.path.splitext(destination_file.name if in_memory else destination_file)[1].lower()
     if ext == '.csv':
         append_df.to_csv(destination_file, index=False)
     elif ext == '.xlsx':
@@ -275,5 +291,5 @@ def append_data_to_ods(extracted_data, max_len, destination_file):
     else:
         raise ValueError("Unsupported export file format: " + ext)
 
-    print(f"Appended {max_len} rows to {destination_file}")
+    print(f"Appended {max_len} rows to {destination_file.name if in_memory else destination_file}")
 
@@ -1,9 +1,11 @@
 import os
 import time
 import requests
-import pdfplumber
 import csv
+import contextlib
+from collections import namedtuple
 from urllib.parse import quote
+from pdf_document import as_document
 
 # Keywords and extraction logic
 keywords_to_capture = {
@@ -13,22 +15,34 @@ keywords_to_capture = {
 }
 global_keywords = {"Borrower Profile", "TransUnion CIBIL Rank"}
 
+# Version of the rows this produces; raise it with any change to what is captured
+STAGE_VERSION = 2
+
 def clean_cell(cell):
     return cell.strip() if cell else ''
 
-#Extracting data from pdf tables to csv format
-def extract_pdf_tables(pdf_path, csv_output_path):
+# One row captured from a report table, with where it came from. cells is the row as written to the
+# CSV; each captured block starts with a heading row ("Page N - Table M - Keyword: K") and ends with []
+TableRow = namedtuple("TableRow", "page table keyword cells")
+
+
+# pdf_path may also be a PdfDocument, the PDF's bytes or a binary file object
+def extract_table_rows(pdf_path):
     keywords_captured = set()
-    with pdfplumber.open(pdf_path) as pdf, open(csv_output_path, 'a', newline='', encoding='utf-8') as f_csv:
-        csv_writer = csv.writer(f_csv)
-        for page_num, page in enumerate(pdf.pages, start=1):
-            tables = page.extract_tables()
+    records = []
+    with as_document(pdf_path) as doc:
+        for page_num in range(1, doc.page_count + 1):
+            tables = doc.tables(page_num - 1)
             if not tables:
                 continue
             for table_idx, table in enumerate(tables, start=1):
                 capturing = False
                 rows_captured = 0
                 current_keyword = None
+
+                def emit(cells):
+                    records.append(TableRow(page_num, table_idx, current_keyword, cells))
+
                 i = 0
                 while i < len(table):
                     row = table[i]
@@ -47,8 +61,8 @@ def extract_pdf_tables(pdf_path, csv_output_path):
                                 current_keyword = keyword
                                 if keyword in global_keywords:
                                     keywords_captured.add(keyword)
-                                csv_writer.writerow([f'Page {page_num} - Table {table_idx} - Keyword: {keyword}'])
-                                csv_writer.writerow(row_cleaned)
+                                emit([f'Page {page_num} - Table {table_idx} - Keyword: {keyword}'])
+                                emit(row_cleaned)
                                 break
                         i += 1
                         continue
@@ -57,7 +71,7 @@ def extract_pdf_tables(pdf_path, csv_output_path):
                             next_row = table[i + 1]
                             next_row_cleaned = [clean_cell(cell) for cell in next_row]
                             merged_row = [row_cleaned[0] + ' ' + next_row_cleaned[0]] + row_cleaned[1:]
-                            csv_writer.writerow(merged_row)
+                            emit(merged_row)
                             rows_captured += 1
                             i += 2
                             continue
@@ -66,17 +80,32 @@ def extract_pdf_tables(pdf_path, csv_output_path):
                             if i < len(table):
                                 next_row = [clean_cell(cell) for cell in table[i]]
                                 rank_value = next_row[1] if len(next_row) > 1 else 'NA'
-                                csv_writer.writerow(['Rank', rank_value])
+                                emit(['Rank', rank_value])
                                 rows_captured += 1
                                 i += 1
                             continue
                         if rows_captured < keywords_to_capture[current_keyword]:
-                            csv_writer.writerow(row_cleaned)
+                            emit(row_cleaned)
                             rows_captured += 1
                             i += 1
                         else:
+                            emit([])
                             capturing = False
                             current_keyword = None
-                            csv_writer.writerow([])
                             i += 1
-    print(f"Extracted: {os.path.basename(pdf_path)} → {os.path.basename(csv_output_path)}")
+    return records
+
+
+#Extracting data from pdf tables to csv format
+# csv_output_path may also be a text file object; an existing file is overwritten
+def extract_pdf_tables(pdf_path, csv_output_path):
+    with as_document(pdf_path) as doc:
+        records = extract_table_rows(doc)
+    if hasattr(csv_output_path, "write"):
+        csv_file = contextlib.nullcontext(csv_output_path)
+    else:
+        csv_file = open(csv_output_path, 'w', newline='', encoding='utf-8')
+    with csv_file as f_csv:
+        csv.writer(f_csv).writerows(record.cells for record in records)
+    print(f"Extracted: {doc.name} → {os.path.basename(csv_output_path) if isinstance(csv_output_path, str) else 'CSV buffer'}")
+    return records
@@ -16,3 +16,137 @@ LOCAL_LOG_FILES = os.path.join(LOCAL_ROOT_FOLDER, "Log Files")
 # Ensure the directories exist
 #for folder in [LOCAL_FILES_TO_PROCESS, LOCAL_OUTPUT_FILES, LOCAL_PROCESSED_FILES, LOCAL_LOG_FILES]:
  #   os.makedirs(folder, exist_ok=True)
+
+# === Processing Pool ===
+# Worker processes used to classify/extract PDFs in parallel (0 = one per CPU core, leaving one free)
+MAX_WORKERS = int(os.getenv("CREDABLE_MAX_WORKERS", "0"))
+# Recycle a worker after it has processed this many files (0 = never)
+WORKER_MAX_FILES = int(os.getenv("CREDABLE_WORKER_MAX_FILES", "20"))
+# Recycle workers once one of them passes this resident memory in MB (0 = no limit)
+WORKER_MAX_RSS_MB = int(os.getenv("CREDABLE_WORKER_MAX_RSS_MB", "1500"))
+
+# === Pipeline ===
+# Downloaded PDFs allowed to wait for a free worker; downloads pause while this many are queued
+PIPELINE_PREFETCH = int(os.getenv("CREDABLE_PIPELINE_PREFETCH", "4"))
+# Threads fetching PDFs from OneDrive
+PIPELINE_DOWNLOAD_THREADS = int(os.getenv("CREDABLE_PIPELINE_DOWNLOAD_THREADS", "2"))
+# Finished files are published together once this many are waiting or PIPELINE_PUBLISH_LINGER seconds pass
+PIPELINE_PUBLISH_BATCH = int(os.getenv("CREDABLE_PIPELINE_PUBLISH_BATCH", "20"))
+PIPELINE_PUBLISH_LINGER = float(os.getenv("CREDABLE_PIPELINE_PUBLISH_LINGER", "2"))
+
+# === Job Journal ===
+# SQLite record of each file's progress, so a restart resumes at the last finished stage
+JOB_JOURNAL_FILE = os.path.join(LOCAL_ROOT_FOLDER, "job_journal.db")
+# A file that fails this many times is left in place until someone looks at it
+JOB_MAX_ATTEMPTS = int(os.getenv("CREDABLE_JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs are forgotten after this many seconds
+JOB_JOURNAL_RETENTION = int(os.getenv("CREDABLE_JOB_JOURNAL_RETENTION", str(30 * 24 * 3600)))
+
+# === Work Leases ===
+# "none" for a single instance; "onedrive" (moves a claimed file into "In Progress/<worker id>") on every
+# instance when several share one folder; "sqlite" uses LEASE_DB_FILE, for instances sharing one disk
+LEASE_BACKEND = os.getenv("CREDABLE_LEASE_BACKEND", "none")
+# Name of this instance; defaults to the host name, so set it when running several instances on one host
+WORKER_ID = os.getenv("CREDABLE_WORKER_ID", "")
+# Claims of an instance that has not sent a heartbeat for this many seconds are handed back to the others
+LEASE_TTL = int(os.getenv("CREDABLE_LEASE_TTL", "300"))
+LEASE_HEARTBEAT_INTERVAL = int(os.getenv("CREDABLE_LEASE_HEARTBEAT_INTERVAL", "60"))
+# Seconds between checks for instances whose claims have expired (each check lists every instance's folder)
+LEASE_RECLAIM_INTERVAL = int(os.getenv("CREDABLE_LEASE_RECLAIM_INTERVAL", "120"))
+LEASE_DB_FILE = os.getenv("CREDABLE_LEASE_DB", os.path.join(LOCAL_ROOT_FOLDER, "work_leases.db"))
+
+# === Folder Watching ===
+# "auto" uses inotify where the OS supports it and falls back to polling, "inotify" requires it, "poll" forces polling
+WATCH_MODE = os.getenv("CREDABLE_WATCH_MODE", "auto")
+# Seconds between OneDrive polls, and between local folder scans when polling
+POLL_INTERVAL = int(os.getenv("CREDABLE_POLL_INTERVAL", "30"))
+
+# === OneDrive Change Feed ===
+# Where the Graph delta token and the last known contents of "Files to Process" are kept between runs
+DELTA_STATE_FILE = os.path.join(LOCAL_ROOT_FOLDER, "onedrive_delta_state.json")
+
+# === Graph Client ===
+# Keep-alive connections held open to Graph per process
+GRAPH_POOL_SIZE = int(os.getenv("CREDABLE_GRAPH_POOL_SIZE", "10"))
+# Access tokens are refreshed this many seconds before they expire
+GRAPH_TOKEN_REFRESH_MARGIN = int(os.getenv("CREDABLE_GRAPH_TOKEN_REFRESH_MARGIN", "300"))
+# Token cache shared by the monitor processes on this host
+GRAPH_TOKEN_CACHE_FILE = os.path.join(LOCAL_ROOT_FOLDER, ".graph_token.json")
+# Connect / read timeouts (seconds) for every Graph call, so one stalled socket cannot freeze a monitor
+GRAPH_CONNECT_TIMEOUT = float(os.getenv("CREDABLE_GRAPH_CONNECT_TIMEOUT", "10"))
+GRAPH_READ_TIMEOUT = float(os.getenv("CREDABLE_GRAPH_READ_TIMEOUT", "120"))
+# Retries for throttled (429/503), gateway errors and dropped connections, honouring Retry-After
+GRAPH_MAX_RETRIES = int(os.getenv("CREDABLE_GRAPH_MAX_RETRIES", "5"))
+# Concurrent Graph calls per process: starts here, halves on throttling and creeps back up while responses stay fast
+GRAPH_CONCURRENCY_INITIAL = int(os.getenv("CREDABLE_GRAPH_CONCURRENCY_INITIAL", "4"))
+GRAPH_CONCURRENCY_MAX = int(os.getenv("CREDABLE_GRAPH_CONCURRENCY_MAX", str(GRAPH_POOL_SIZE)))
+# Responses slower than this (seconds) stop the concurrency from growing
+GRAPH_LATENCY_TARGET = float(os.getenv("CREDABLE_GRAPH_LATENCY_TARGET", "2"))
+# Drive ids and folder ids are cached for this many seconds
+GRAPH_METADATA_TTL = int(os.getenv("CREDABLE_GRAPH_METADATA_TTL", str(24 * 3600)))
+# On-disk copy of that cache so restarts skip the lookups (set CREDABLE_GRAPH_METADATA_CACHE="" for memory only)
+GRAPH_METADATA_CACHE_FILE = os.getenv("CREDABLE_GRAPH_METADATA_CACHE", os.path.join(LOCAL_ROOT_FOLDER, "graph_metadata_cache.json"))
+
+# === Uploads ===
+# Files larger than this go through a resumable Graph upload session instead of one PUT
+UPLOAD_SESSION_THRESHOLD = int(os.getenv("CREDABLE_UPLOAD_SESSION_THRESHOLD", str(4 * 1024 * 1024)))
+# Upload session chunk size; Graph requires a multiple of 320 KiB
+UPLOAD_CHUNK_SIZE = int(os.getenv("CREDABLE_UPLOAD_CHUNK_SIZE", str(32 * 320 * 1024)))
+# Retries for one chunk before the upload is given up (it can still be resumed later)
+UPLOAD_MAX_RETRIES = int(os.getenv("CREDABLE_UPLOAD_MAX_RETRIES", "5"))
+# Files too large for a $batch upload that are sent at the same time (a session's own chunks always go in order)
+UPLOAD_PARALLEL_FILES = int(os.getenv("CREDABLE_UPLOAD_PARALLEL_FILES", "4"))
+# Open upload sessions, so an interrupted upload resumes after a restart
+UPLOAD_SESSION_STATE_FILE = os.path.join(LOCAL_ROOT_FOLDER, "upload_sessions.json")
+
+# === Downloads ===
+# Read buffer for streamed downloads and hash checks
+DOWNLOAD_BUFFER_SIZE = int(os.getenv("CREDABLE_DOWNLOAD_BUFFER_SIZE", str(1024 * 1024)))
+# Files at least this large are fetched as parallel HTTP Range segments
+DOWNLOAD_PARALLEL_THRESHOLD = int(os.getenv("CREDABLE_DOWNLOAD_PARALLEL_THRESHOLD", str(8 * 1024 * 1024)))
+DOWNLOAD_SEGMENT_SIZE = int(os.getenv("CREDABLE_DOWNLOAD_SEGMENT_SIZE", str(4 * 1024 * 1024)))
+DOWNLOAD_CONNECTIONS = int(os.getenv("CREDABLE_DOWNLOAD_CONNECTIONS", "4"))
+# Check downloaded files against the hash OneDrive reports for them
+DOWNLOAD_VERIFY_HASH = os.getenv("CREDABLE_DOWNLOAD_VERIFY_HASH", "1") == "1"
+
+# === Diskless Mode ===
+# Keep OneDrive PDFs and their outputs in memory: downloaded bytes go straight to the parsers and
+# outputs are uploaded from buffers, so a OneDrive job writes nothing locally
+DISKLESS_MODE = os.getenv("CREDABLE_DISKLESS", "0") == "1"
+# Larger PDFs still go through a file in the download folder, to bound the memory a job can take
+DISKLESS_MAX_BYTES = int(os.getenv("CREDABLE_DISKLESS_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# === Batching ===
+# Independent Graph calls (moves, lookups, small uploads, deletes) are sent in $batch requests of this size (Graph allows at most 20)
+GRAPH_BATCH_SIZE = min(20, int(os.getenv("CREDABLE_GRAPH_BATCH_SIZE", "20")))
+# Files up to this size are uploaded inside a batch; larger ones are PUT on their own
+GRAPH_BATCH_UPLOAD_MAX_BYTES = int(os.getenv("CREDABLE_GRAPH_BATCH_UPLOAD_MAX_BYTES", str(512 * 1024)))
+# Rounds of resending throttled (429/503) entries before they are reported as failed
+GRAPH_BATCH_MAX_RETRIES = int(os.getenv("CREDABLE_GRAPH_BATCH_MAX_RETRIES", "3"))
+
+# === Extraction API ===
+# Bearer token callers of POST /extract in login.py must send; the endpoint is off while this is empty
+API_TOKEN = os.getenv("CREDABLE_API_TOKEN", "")
+# PDFs extracted at the same time (0 = one per worker process)
+API_MAX_CONCURRENT = int(os.getenv("CREDABLE_API_MAX_CONCURRENT", "0"))
+# Requests allowed to wait for a free slot; beyond this callers get 503 with Retry-After
+API_MAX_QUEUE = int(os.getenv("CREDABLE_API_MAX_QUEUE", "8"))
+# Seconds a request may wait for a slot plus run before it is answered with 504
+API_TIMEOUT = int(os.getenv("CREDABLE_API_TIMEOUT", "120"))
+API_MAX_UPLOAD_MB = int(os.getenv("CREDABLE_API_MAX_UPLOAD_MB", "50"))
+
+# === Classification ===
+# Classification results remembered per worker process, keyed by a fingerprint of the PDF's first page
+CLASSIFIER_CACHE_SIZE = int(os.getenv("CREDABLE_CLASSIFIER_CACHE_SIZE", "1024"))
+
+# === Artifact Cache ===
+# Each stage's output per PDF, keyed by its sha256 and the stage's code version
+ARTIFACT_CACHE_DIR = os.getenv("CREDABLE_ARTIFACT_CACHE_DIR", os.path.join(LOCAL_ROOT_FOLDER, "Artifact Cache"))
+# Least recently used artifacts are evicted beyond this size (0 = cache off); always off in diskless mode
+ARTIFACT_CACHE_MAX_MB = int(os.getenv("CREDABLE_ARTIFACT_CACHE_MAX_MB", "1024"))
+
+# === Debugging ===
+# Reports go from extraction to import in memory; set this to also keep each report's intermediate rows
+# (the table CSV, the text extract .ods) in DEBUG_INTERMEDIATES_DIR for inspection
+DEBUG_INTERMEDIATES = os.getenv("CREDABLE_DEBUG_INTERMEDIATES", "0") == "1"
+DEBUG_INTERMEDIATES_DIR = os.getenv("CREDABLE_DEBUG_INTERMEDIATES_DIR", os.path.join(LOCAL_ROOT_FOLDER, "Intermediate Files"))
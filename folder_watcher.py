@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import bisect
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+import config
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+INDEX_MASK = WATCH_MASK | IN_MOVED_FROM | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _inotify_libc():
+    global _libc
+    if _libc is None and sys.platform.startswith("linux"):
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    return _libc
+
+
+def _open_inotify(folder, mask=WATCH_MASK):
+    libc = _inotify_libc()
+    if libc is None or not hasattr(libc, "inotify_init1"):
+        raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    if libc.inotify_add_watch(fd, os.fsencode(folder), mask) < 0:
+        err = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(err, f"inotify_add_watch failed for {folder}")
+    return fd
+
+
+def _drain_events(fd):
+    """(mask, name) for each inotify event waiting on fd, without blocking."""
+    try:
+        buf = os.read(fd, READ_SIZE)
+    except BlockingIOError:
+        return
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(buf):
+        _, mask, _, name_len = EVENT_HEADER.unpack_from(buf, offset)
+        name_start = offset + EVENT_HEADER.size
+        yield mask, os.fsdecode(buf[name_start:name_start + name_len].rstrip(b"\0"))
+        offset = name_start + name_len
+
+
+class FolderWatcher:
+    """Tracks PDFs that are ready to process in a local folder, via inotify where available, else polling."""
+
+    def __init__(self, folder, suffix=".pdf", mode=None):
+        self.folder = folder
+        self.suffix = suffix.lower()
+        self.mode = (mode or config.WATCH_MODE).lower()
+        self._pending = {}
+        # (size, mtime_ns) of each PDF as last listed, so polling only reports new or changed files
+        self._seen = {}
+        self._fd = None
+
+        if self.mode in ("auto", "inotify"):
+            try:
+                self._fd = _open_inotify(folder)
+                logging.info(f" Watching {folder} with inotify")
+            except OSError as e:
+                if self.mode == "inotify":
+                    raise
+                logging.warning(f" inotify unavailable ({e}) – polling {folder} instead")
+
+        # Files that were already waiting before we started watching
+        self._scan()
+
+    @property
+    def event_driven(self):
+        return self._fd is not None
+
+    def _scan(self):
+        seen = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(self.suffix):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                seen[entry.name] = (st.st_size, st.st_mtime_ns)
+                if self._seen.get(entry.name) != seen[entry.name]:
+                    self._pending.setdefault(entry.name, None)
+        self._seen = seen
+
+    def _fall_back_to_polling(self, reason):
+        logging.warning(f" Stopped watching {self.folder} ({reason}) – switching to polling")
+        self.close()
+        os.makedirs(self.folder, exist_ok=True)
+        self._seen.clear()
+        self._scan()
+
+    def _read_events(self):
+        for mask, name in _drain_events(self._fd):
+            if mask & IN_Q_OVERFLOW:
+                # Kernel queue overflowed and events were dropped – recover with one listing
+                self._seen.clear()
+                self._scan()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self._fall_back_to_polling("folder was moved or removed")
+                return
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and name.lower().endswith(self.suffix):
+                self._pending.setdefault(name, None)
+
+    def wait(self, timeout=None):
+        """Block until a PDF is ready or timeout seconds pass (None = wait indefinitely when event driven)."""
+        if self._pending:
+            return True
+        if self._fd is None:
+            time.sleep(config.POLL_INTERVAL if timeout is None else timeout)
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._fd is not None and not self._pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                return False
+            self._read_events()
+        return bool(self._pending) or self._fd is None
+
+    def take_ready(self):
+        """Return the names of PDFs ready to process and forget them."""
+        if self._fd is not None:
+            self._read_events()
+        else:
+            self._scan()
+        names = [name for name in self._pending if os.path.exists(os.path.join(self.folder, name))]
+        self._pending.clear()
+        return names
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class FolderIndex:
+    """In-memory listing of the PDFs in a folder, sorted case-insensitively, with their size and modification time.
+
+    Kept current from inotify create/delete/move events where available; elsewhere the folder is
+    listed again whenever its modification time changes. Call refresh() before reading it.
+    """
+
+    def __init__(self, folder, suffix=".pdf", mode=None):
+        self.folder = folder
+        self.suffix = suffix.lower()
+        self.mode = (mode or config.WATCH_MODE).lower()
+        self.names = []
+        self._keys = []  # lower-cased names, parallel to self.names, for bisecting
+        self.stats = {}
+        # Bumped on every change, so callers can tag cached responses with it
+        self.generation = 0
+        self.changed_at = time.time()
+        self._folder_mtime = None
+        self._fd = None
+
+        if self.mode in ("auto", "inotify"):
+            try:
+                self._fd = _open_inotify(folder, INDEX_MASK)
+            except OSError as e:
+                if self.mode == "inotify":
+                    raise
+                logging.warning(f" inotify unavailable ({e}) – indexing {folder} by polling")
+        self._scan()
+
+    def _changed(self):
+        self.generation += 1
+        self.changed_at = time.time()
+
+    def _scan(self):
+        stats = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith(self.suffix) and entry.is_file():
+                    st = entry.stat()
+                    stats[entry.name] = (st.st_size, st.st_mtime)
+        self.stats = stats
+        self.names = sorted(stats, key=str.lower)
+        self._keys = [name.lower() for name in self.names]
+        self._folder_mtime = os.stat(self.folder).st_mtime_ns
+        self._changed()
+
+    def _add(self, name):
+        try:
+            st = os.stat(os.path.join(self.folder, name))
+        except FileNotFoundError:
+            self._remove(name)
+            return
+        if name not in self.stats:
+            i = bisect.bisect_left(self._keys, name.lower())
+            self._keys.insert(i, name.lower())
+            self.names.insert(i, name)
+        self.stats[name] = (st.st_size, st.st_mtime)
+        self._changed()
+
+    def _remove(self, name):
+        if self.stats.pop(name, None) is not None:
+            i = self.names.index(name, bisect.bisect_left(self._keys, name.lower()))
+            del self.names[i], self._keys[i]
+            self._changed()
+
+    def refresh(self):
+        if self._fd is None:
+            try:
+                if os.stat(self.folder).st_mtime_ns != self._folder_mtime:
+                    self._scan()
+            except FileNotFoundError:
+                pass
+            return
+        for mask, name in _drain_events(self._fd):
+            if mask & IN_Q_OVERFLOW:
+                self._scan()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                logging.warning(f" Stopped watching {self.folder} – indexing by polling")
+                self.close()
+                return
+            elif not name.lower().endswith(self.suffix):
+                continue
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._remove(name)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._add(name)
+
+    def __contains__(self, name):
+        return name in self.stats
+
+    def __len__(self):
+        return len(self.names)
+
+    def page(self, prefix="", offset=0, limit=100):
+        """(names, total): up to limit names starting with prefix (any case), skipping the first offset of them."""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + "\U0010ffff") if prefix else len(self._keys)
+        return self.names[start + offset:min(end, start + offset + limit)], end - start
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
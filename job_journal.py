@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import config
+
+# Stages a job passes through, in order; "failed" records the stage that went wrong in last_ok_state
+STATES = ("discovered", "downloaded", "classified", "extracted", "uploaded", "moved")
+FAILED = "failed"
+
+
+def state_reached(entry, state):
+    """Whether the job behind entry has finished `state` (a failed job counts up to its last good stage)."""
+    if entry is None:
+        return False
+    current = entry["last_ok_state"] if entry["state"] == FAILED else entry["state"]
+    return current in STATES and STATES.index(current) >= STATES.index(state)
+
+
+def file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(config.DOWNLOAD_BUFFER_SIZE), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def onedrive_job_key(item):
+    """Drive item id plus its content tag, so a re-uploaded file is a new job with its failed attempts cleared."""
+    hashes = (item.get("file") or {}).get("hashes") or {}
+    content = item.get("cTag") or hashes.get("quickXorHash") or hashes.get("sha256Hash") or hashes.get("sha1Hash") or ""
+    return f"{item['id']}:{content}"
+
+
+# Content hashes of local files by path, reused while the file's size and modification time stay the same
+_local_keys = OrderedDict()
+LOCAL_KEY_MEMO_SIZE = 1024
+
+
+def local_job_key(path):
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    memo = _local_keys.get(path)
+    if memo is not None and memo[0] == stamp:
+        _local_keys.move_to_end(path)
+        return memo[1]
+    key = f"local:{file_sha1(path)}"
+    _local_keys[path] = (stamp, key)
+    _local_keys.move_to_end(path)
+    while len(_local_keys) > LOCAL_KEY_MEMO_SIZE:
+        _local_keys.popitem(last=False)
+    return key
+
+
+class JobJournal:
+    """SQLite record of how far each file got, so a restarted monitor resumes instead of redoing work.
+
+    Safe to share between the monitor's threads; worker processes open their own instance.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or config.JOB_JOURNAL_FILE
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            # WAL lets the worker processes record progress while the monitor reads
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    key TEXT PRIMARY KEY,
+                    item_id TEXT,
+                    name TEXT,
+                    state TEXT NOT NULL,
+                    last_ok_state TEXT,
+                    pdf_type TEXT,
+                    outputs TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["outputs"] = json.loads(entry["outputs"]) if entry["outputs"] else []
+        return entry
+
+    def record(self, key, state, item_id=None, name=None, pdf_type=None, outputs=None):
+        """Mark key as having finished state; fields left as None keep their stored value."""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO jobs (key, item_id, name, state, last_ok_state, pdf_type, outputs, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    item_id = COALESCE(excluded.item_id, item_id),
+                    name = COALESCE(excluded.name, name),
+                    state = excluded.state,
+                    last_ok_state = excluded.state,
+                    pdf_type = COALESCE(excluded.pdf_type, pdf_type),
+                    outputs = COALESCE(excluded.outputs, outputs),
+                    error = NULL,
+                    attempts = CASE WHEN excluded.state = 'discovered' THEN 0 ELSE attempts END,
+                    updated_at = excluded.updated_at
+            """, (key, item_id, name, state, state, pdf_type, None if outputs is None else json.dumps(outputs), time.time()))
+
+    def fail(self, key, error):
+        """Mark key as failed, keeping the last stage it finished; returns the number of failed attempts."""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO jobs (key, state, error, attempts, updated_at) VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state = excluded.state, error = excluded.error, attempts = attempts + 1, updated_at = excluded.updated_at
+            """, (key, FAILED, str(error), time.time()))
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE key = ?", (key,)).fetchone()
+        return row["attempts"]
+
+    def prune(self, max_age):
+        """Forget finished jobs older than max_age seconds."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE state = 'moved' AND updated_at < ?", (time.time() - max_age,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_journal():
+    """The journal for this process, opened on first use."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = JobJournal()
+        return _journal
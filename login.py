@@ -1,6 +1,22 @@
-from flask import Flask, request, send_from_directory, redirect, url_for, render_template_string
+import io
+import os
+import hmac
+import time
+import shutil
+import zipfile
+import tempfile
+import threading
+import concurrent.futures
+from datetime import datetime, timezone
+from flask import Flask, request, send_from_directory, redirect, url_for, render_template_string, jsonify, send_file, abort
+from werkzeug.utils import secure_filename
+
+import config
+import report_handlers
+from folder_watcher import FolderIndex
 
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = config.API_MAX_UPLOAD_MB * 1024 * 1024
 
 # Set your login credentials
 USERNAME = "admin"
@@ -8,6 +24,8 @@ PASSWORD = "1234"
 
 # Local directory with PDFs
 PDF_FOLDER = "pdfs"
+FILES_PER_PAGE = 100
+MAX_FILES_PER_PAGE = 1000
 
 # In-memory session (very basic)
 sessions = set()
@@ -24,13 +42,34 @@ login_template = '''
 
 file_list_template = '''
 <h2>Available PDF Files</h2>
+<form method="get">
+  <input name="prefix" value="{{ prefix }}" placeholder="File name starts with">
+  <button type="submit">Filter</button>
+</form>
+<p>{{ total }} file(s){% if pages > 1 %}, page {{ page }} of {{ pages }}{% endif %}</p>
 <ul>
   {% for file in files %}
-    <li><a href="/pdf/{{ file }}">{{ file }}</a></li>
+    <li><a href="/pdf/{{ file | urlencode }}">{{ file }}</a></li>
   {% endfor %}
 </ul>
+{% if page > 1 %}<a href="{{ url_for('list_pdfs', prefix=prefix, page=page - 1, per_page=per_page) }}">Previous</a>{% endif %}
+{% if page < pages %}<a href="{{ url_for('list_pdfs', prefix=prefix, page=page + 1, per_page=per_page) }}">Next</a>{% endif %}
 '''
 
+# Index of PDF_FOLDER, kept current from file system events instead of listing the folder per request
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The index of PDF_FOLDER, brought up to date; callers must hold _index_lock."""
+    global _index
+    if _index is None:
+        os.makedirs(PDF_FOLDER, exist_ok=True)
+        _index = FolderIndex(PDF_FOLDER)
+    _index.refresh()
+    return _index
+
 @app.route('/', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -44,15 +83,179 @@ def login():
 def list_pdfs():
     if request.remote_addr not in sessions:
         return redirect('/')
-    import os
-    files = [f for f in os.listdir(PDF_FOLDER) if f.endswith('.pdf')]
-    return render_template_string(file_list_template, files=files)
+    prefix = request.args.get('prefix', '')
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(MAX_FILES_PER_PAGE, max(1, request.args.get('per_page', FILES_PER_PAGE, type=int)))
+    with _index_lock:
+        index = get_index()
+        # The page only changes when the folder does, so browsers can revalidate it for free.
+        # Last-Modified has one-second resolution, so it is only sent once the folder has been quiet
+        # for a second; any later change then falls in a later second. When the folder is polled
+        # rather than watched, a change is only seen once the folder's modification time moves, which
+        # on file systems with coarse timestamps (FAT, some network shares) can be a couple of seconds late.
+        etag = f"{index.generation}-{index.changed_at:.6f}"
+        last_modified = None
+        if time.time() - index.changed_at >= 1:
+            last_modified = datetime.fromtimestamp(int(index.changed_at), timezone.utc)
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = (last_modified is not None and request.if_modified_since is not None
+                            and last_modified <= request.if_modified_since)
+        if not_modified:
+            resp = app.response_class(status=304)
+        else:
+            files, total = index.page(prefix, (page - 1) * per_page, per_page)
+            pages = max(1, -(-total // per_page))
+            resp = app.make_response(render_template_string(
+                file_list_template, files=files, total=total, prefix=prefix, page=page, pages=pages, per_page=per_page))
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
 
 @app.route('/pdf/<filename>')
 def serve_pdf(filename):
     if request.remote_addr not in sessions:
         return redirect('/')
-    return send_from_directory(PDF_FOLDER, filename)
+    with _index_lock:
+        if filename not in get_index():
+            abort(404)
+    # Conditional: ETag/Last-Modified with 304s, and Range requests so viewers can fetch only the pages they show.
+    # The body is streamed through the server's file wrapper (sendfile where the WSGI server supports it).
+    resp = send_from_directory(PDF_FOLDER, filename, conditional=True, etag=True, max_age=0)
+    resp.cache_control.private = True
+    return resp
+
+# === Extraction API ===
+# POST /extract runs a PDF through the monitor's report handlers and answers with the extracted rows
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+_waiting = 0
+_waiting_lock = threading.Lock()
+
+
+def get_pool():
+    """The extraction worker pool, started (and warmed up) on first use."""
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            from worker_pool import WorkerPool
+            _pool = WorkerPool()
+            _pool.warm_up()
+            _slots = threading.BoundedSemaphore(config.API_MAX_CONCURRENT or _pool.workers)
+        return _pool
+
+
+def _authorized():
+    supplied = request.headers.get("Authorization", "")
+    return supplied.startswith("Bearer ") and hmac.compare_digest(supplied[7:].encode(), config.API_TOKEN.encode())
+
+
+def _api_error(message, status, queue_depth, **headers):
+    resp = jsonify(error=message)
+    resp.status_code = status
+    resp.headers["X-Queue-Depth"] = str(queue_depth)
+    resp.headers.update(headers)
+    return resp
+
+
+def _xlsx_response(outputs, pdf_name):
+    # Read into memory so the scratch folder can be removed before the response is sent
+    if len(outputs) == 1:
+        with open(outputs[0], "rb") as f:
+            data = io.BytesIO(f.read())
+        return send_file(data, as_attachment=True, download_name=os.path.basename(outputs[0]),
+                         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in outputs:
+            zf.write(path, os.path.basename(path))
+    data.seek(0)
+    return send_file(data, as_attachment=True, download_name=os.path.splitext(pdf_name)[0] + ".zip",
+                     mimetype="application/zip")
+
+
+@app.route('/extract', methods=['POST'])
+def extract():
+    global _waiting
+    if not config.API_TOKEN:
+        return _api_error("Extraction API is disabled (CREDABLE_API_TOKEN is not set)", 503, 0)
+    if not _authorized():
+        return _api_error("Missing or invalid bearer token", 401, 0, **{"WWW-Authenticate": "Bearer"})
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return _api_error("Send the PDF as multipart form field 'file'", 400, 0)
+    # Only a plain file name is ever joined onto the job folder
+    pdf_name = secure_filename(upload.filename) or "upload.pdf"
+    if len(pdf_name.encode()) > 255:
+        return _api_error("File name is too long", 400, 0)
+    if upload.stream.read(5) != b"%PDF-":
+        return _api_error(f"{upload.filename} is not a PDF", 415, 0)
+    upload.stream.seek(0)
+
+    pool = get_pool()
+    with _waiting_lock:
+        queue_depth = _waiting
+        if queue_depth >= config.API_MAX_QUEUE:
+            return _api_error("Too many extractions queued, try again shortly", 503, queue_depth, **{"Retry-After": "5"})
+        _waiting += 1
+    # Waiting for a slot and the extraction itself share one API_TIMEOUT budget
+    deadline = time.monotonic() + config.API_TIMEOUT
+    try:
+        acquired = _slots.acquire(timeout=config.API_TIMEOUT)
+    finally:
+        with _waiting_lock:
+            _waiting -= 1
+    if not acquired:
+        return _api_error("Timed out waiting for a free extraction slot", 504, queue_depth)
+    if time.monotonic() >= deadline:
+        _slots.release()
+        return _api_error("Timed out waiting for a free extraction slot", 504, queue_depth)
+
+    job_dir = tempfile.mkdtemp(prefix="api_job_")
+
+    def finished(_=None):
+        _slots.release()
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    pdf_path = os.path.join(job_dir, pdf_name)
+    try:
+        upload.save(pdf_path)
+        future = pool.submit(report_handlers.extract_report, pdf_path, job_dir)
+    except Exception:
+        finished()
+        raise
+    try:
+        report_type, outputs, records = future.result(timeout=max(0, deadline - time.monotonic()))
+    except concurrent.futures.TimeoutError:
+        # The worker is still busy with it: keep its slot and files until it is done
+        future.add_done_callback(finished)
+        return _api_error(f"Extraction of {pdf_name} did not finish in {config.API_TIMEOUT}s", 504, queue_depth)
+    except ValueError as e:
+        finished()
+        return _api_error(str(e), 422, queue_depth)
+    except Exception as e:
+        finished()
+        app.logger.exception(f"Extraction failed for {pdf_name}")
+        return _api_error(f"Extraction failed: {e}", 500, queue_depth)
+
+    try:
+        if request.args.get("format") == "xlsx":
+            resp = _xlsx_response(outputs, pdf_name)
+        else:
+            resp = jsonify(file=pdf_name, report_type=report_type, facilities=records)
+    finally:
+        finished()
+    resp.headers["X-Queue-Depth"] = str(queue_depth)
+    return resp
+
 
 if __name__ == '__main__':
+    # With the reloader on, only the child process that serves requests starts the workers
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        get_pool()
     app.run(debug=True)
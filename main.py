@@ -1,17 +1,24 @@
 import os
 import time
 import logging
-import pdfplumber
 import importlib.util
+import multiprocessing
 from datetime import datetime
 from dotenv import load_dotenv
-import main_tables
-import main_text
+import report_handlers
+from pdf_document import PdfDocument
+from worker_pool import WorkerPool
+from folder_watcher import FolderWatcher
+from pipeline import Pipeline, PipelineJob
+from job_journal import get_journal, state_reached, onedrive_job_key, local_job_key, FAILED
+from work_lease import create_leases
 
-import importlib.util
 import sys
 from pathlib import Path
 
+# Start-up timings in the log are measured from here
+STARTED_AT = time.perf_counter()
+
 # Dynamically load external onedrive_utils.py
 BASE_DIR = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).parent
 
@@ -37,9 +44,14 @@ get_headers = onedrive_utils.get_headers
 get_drive_id = onedrive_utils.get_drive_id
 get_text_drive_id = onedrive_utils.get_text_drive_id
 list_folder_files = onedrive_utils.list_folder_files
+FolderDeltaFeed = onedrive_utils.FolderDeltaFeed
 download_file = onedrive_utils.download_file
+download_bytes = onedrive_utils.download_bytes
+get_items = onedrive_utils.get_items
+verify_download = onedrive_utils.verify_download
 move_file_to_folder = onedrive_utils.move_file_to_folder
 upload_file_to_onedrive = onedrive_utils.upload_file_to_onedrive
+publish_results = onedrive_utils.publish_results
 upload_log_file = onedrive_utils.upload_log_file
 
 TARGET_FOLDER_PATH = onedrive_utils.TARGET_FOLDER_PATH
@@ -61,11 +73,14 @@ LOCAL_INPUT_PDF_DIR = config.LOCAL_FILES_TO_PROCESS
 LOCAL_OUTPUT_DIR = config.LOCAL_OUTPUT_FILES
 LOCAL_PROCESSED_DIR = config.LOCAL_PROCESSED_FILES
 LOCAL_LOG_DIR = config.LOCAL_LOG_FILES
+# OneDrive PDFs are downloaded outside the watched input folder so they are not picked up twice
+LOCAL_DOWNLOAD_DIR = os.path.join(config.LOCAL_ROOT_FOLDER, "OneDrive Downloads")
 
 
 UPLOAD_INTERVAL = 300  # 5 minutes
 
-os.makedirs(LOCAL_PROCESSED_DIR, exist_ok=True)
+for path in [LOCAL_INPUT_PDF_DIR, LOCAL_OUTPUT_DIR, LOCAL_PROCESSED_DIR, LOCAL_LOG_DIR, LOCAL_DOWNLOAD_DIR]:
+    os.makedirs(path, exist_ok=True)
 
 # Setup logging
 def setup_logging():
@@ -85,123 +100,220 @@ def setup_logging():
     logging.getLogger().addHandler(console)
     return log_file
 
-# Classify PDF type
-def classify_pdf(file_path):
-    table_keywords = ["Borrower Profile"]
-    text_keywords = ["CONSUMER CIR"]
-
-    try:
-        with pdfplumber.open(file_path) as pdf:
-            content = ""
-            for page in pdf.pages[:2]:
-                text = page.extract_text()
-                if text:
-                    content += text.lower()
-
-        table_score = sum(1 for kw in table_keywords if kw.lower() in content)
-        text_score = sum(1 for kw in text_keywords if kw.lower() in content)
-
-        if table_score > text_score:
-            return "table"
-        elif text_score > table_score:
-            return "text"
-        return "unknown"
-    except Exception as e:
-        logging.error(f"Failed to classify PDF {file_path}: {e}")
-        return "unknown"
-
-def process_pdf(file_path, pdf_type, headers=None, drive_id=None, file_id=None):
-    try:
-        if pdf_type == "table":
-            csv_name = os.path.splitext(os.path.basename(file_path))[0] + ".csv"
-            csv_output = os.path.join(LOCAL_OUTPUT_DIR, csv_name)
-            main_tables.extract_pdf_tables(file_path, csv_output)
-            logging.info(f"Extracted table CSV: {csv_output}")
-
-            main_tables.process_local_files(
-                headers=headers,
-                user_email=USER_ID,
-                local_input_dir=LOCAL_OUTPUT_DIR,
-                local_export_dir=LOCAL_OUTPUT_DIR,
-                onedrive_export_folder=ONEDRIVE_EXPORT_FOLDER,
-                only_file=csv_name
-            )
-            logging.info(f"Processed table CSV: {csv_name}")
-            os.remove(csv_output)
-
-        elif pdf_type == "text":
-            extracted_files = main_text.text_extract.extract_pdf_folder(
-                os.path.dirname(file_path), output_folder=LOCAL_OUTPUT_DIR, output_format="ods"
-            )
-            logging.info(f"Extracted text files: {extracted_files}")
-            for extracted in extracted_files:
-                processed = main_text.text_import.main(extracted, output_dir=LOCAL_OUTPUT_DIR)
-                logging.info(f"Processed text file: {processed}")
-                if headers and drive_id:
-                    upload_file_to_onedrive(processed, ONEDRIVE_EXPORT_FOLDER)
-                os.remove(extracted)
-
-    except Exception as e:
-        logging.error(f"Error processing {file_path}: {e}")
-
+# Classify and extract one PDF inside a pool worker; uploads stay in the monitor process.
+# A PDF passed as a MemoryFile (diskless mode) gets its outputs back in memory too.
+def process_job(file_path, journal_key=None, pdf_type=None):
+    output_dir = None if isinstance(file_path, report_handlers.MemoryFile) else LOCAL_OUTPUT_DIR
+    # Parsed once: the pages read to classify the report are reused by its extractor
+    with PdfDocument(file_path) as doc:
+        if pdf_type is None:
+            pdf_type = report_handlers.classify_pdf(doc)
+            # An "unknown" result is not kept, so a retry classifies the file again
+            if journal_key and pdf_type != "unknown":
+                get_journal().record(journal_key, "classified", pdf_type=pdf_type)
+        return report_handlers.process_report(doc, output_dir, pdf_type)
+
+# === Unified Monitor ===
+# One scheduler for every report type: each file is classified once and handed to report_handlers
 def monitor():
     log_file = setup_logging()
+    logging.info(f" Report handlers: {', '.join(report_handlers.HANDLERS)}")
+    pool = WorkerPool(log_file=log_file)
+    # Workers spawn and import the PDF libraries in the background while we connect and poll
+    pool.warm_up()
+    watcher = FolderWatcher(LOCAL_INPUT_PDF_DIR)
     headers = None
     drive_id = None
+    feed = None
 
     try:
         headers = get_headers()
         drive_id = get_text_drive_id(headers)
+        feed = FolderDeltaFeed(drive_id, TARGET_FOLDER_PATH)
         logging.info("Connected to OneDrive.")
-    except Exception as e:
+    except Exception:
         logging.warning(" Failed to connect to OneDrive. Running in local mode.")
 
+    # Claims keep several monitor instances on the same OneDrive folder from processing a file twice
+    leases = None
+    if headers and drive_id:
+        try:
+            leases = create_leases(headers, drive_id)
+            if leases:
+                leases.start()
+        except Exception as e:
+            logging.error(f" Could not set up work claiming, files may be processed by several instances: {e}")
+            leases = None
+
+    # Progress of every file, so a restart resumes each one at its last finished stage
+    journal = get_journal()
+    journal.prune(config.JOB_JOURNAL_RETENTION)
+
+    # === Pipeline stages: downloads and publishing run on threads, classify/extract in the pool ===
+    def download(job):
+        if not job.item or job.result is not None:
+            return  # local file, or already extracted before a restart
+        if state_reached(job.state, "downloaded") and os.path.exists(job.path):
+            try:
+                verify_download(job.path, job.item)
+                logging.info(f"[OneDrive] Reusing earlier download of {job.item['name']}")
+                return
+            except IOError:
+                pass
+        if config.DISKLESS_MODE and (job.item.get('size') or 0) <= config.DISKLESS_MAX_BYTES:
+            logging.info(f"[OneDrive] Processing {job.item['name']} in memory")
+            job.data = report_handlers.MemoryFile(job.item['name'], download_bytes(headers, drive_id, job.item['id'], item=job.item))
+            return
+        logging.info(f"[OneDrive] Processing {job.item['name']}")
+        download_file(headers, drive_id, job.item['id'], job.path, item=job.item)
+
+    def publish(jobs):
+        errors = {}
+        remote = [job for job in jobs if job.item]
+        if remote:
+            keys = {job.item['id']: job.key for job in remote}
+            # Outputs already uploaded before a restart are not sent again
+            results = [(job.item, [] if state_reached(job.state, "uploaded") else job.result[1]) for job in remote]
+            # Uploads and moves for the whole batch go out as a few $batch requests
+            item_errors = publish_results(headers, drive_id, results, ONEDRIVE_EXPORT_FOLDER, ONEDRIVE_PROCESSED_FOLDER,
+                                          on_uploaded=lambda item: journal.record(keys[item['id']], "uploaded"))
+            errors.update({job.key: item_errors.get(job.item['id']) for job in remote})
+        for job in jobs:
+            if job.item:
+                continue
+            fname = os.path.basename(job.path)
+            try:
+                os.rename(job.path, os.path.join(LOCAL_PROCESSED_DIR, fname))
+                logging.info(f"Moved processed file to {LOCAL_PROCESSED_DIR}: {fname}")
+            except Exception as e:
+                errors[job.key] = e
+        return errors
+
+    def checkpoint(job, stage):
+        if stage == "download":
+            journal.record(job.key, "downloaded")
+        elif stage == "process":
+            # In-memory outputs cannot be picked up again after a restart, so only files are recorded
+            outputs = [output for output in job.result[1] if isinstance(output, str)]
+            journal.record(job.key, "extracted", pdf_type=job.result[0], outputs=outputs)
+        elif stage == "publish":
+            journal.record(job.key, "moved")
+
+    def submit(key, path, item=None):
+        if key in pipeline:
+            return False
+        entry = journal.get(key)
+        if entry and entry["state"] == FAILED and entry["attempts"] >= config.JOB_MAX_ATTEMPTS:
+            # Logged once per poll for OneDrive files; a new upload of the file is a new job and is tried again
+            logging.warning(f"Skipping {os.path.basename(path)}: gave up after {entry['attempts']} failed attempts "
+                            f"({entry['error']})")
+            if item:
+                passed_over.add(item['id'])
+            return False
+        if item and leases and not leases.claim(item):
+            # Held by another instance: not tried again before the next poll shows whether it is still there
+            passed_over.add(item['id'])
+            return False
+        if entry is None or entry["state"] == "moved":
+            # New file, or a processed one that was put back to be run again
+            journal.record(key, "discovered", item_id=item['id'] if item else None, name=os.path.basename(path))
+            entry = None
+        result = None
+        if state_reached(entry, "extracted") and entry["outputs"] and all(os.path.exists(output) for output in entry["outputs"]):
+            result = (entry["pdf_type"], entry["outputs"])
+        pdf_type = entry["pdf_type"] if state_reached(entry, "classified") and entry["pdf_type"] != "unknown" else None
+        return pipeline.submit(PipelineJob(key, path, item, args=(key, pdf_type), result=result, state=entry))
+
+    pipeline = Pipeline(pool, download, process_job, publish, checkpoint=checkpoint)
     last_log_upload_time = time.time()
+    next_poll_time = 0
+    next_reclaim_time = 0
+    # OneDrive items not to submit again before the next poll: claim failed, job failed or given up on
+    passed_over = set()
+    # Only claim what this instance can start on soon, leaving the rest of the backlog to the others
+    max_in_flight = pool.workers + config.PIPELINE_PREFETCH
+    first_poll_logged = first_file_logged = False
 
     try:
         while True:
-            processed_any = False
-
             # === OneDrive Processing ===
-            if headers and drive_id:
+            if headers and drive_id and time.time() >= next_poll_time:
+                next_poll_time = time.time() + config.POLL_INTERVAL
                 try:
-                    files = list_folder_files(headers, drive_id, TARGET_FOLDER_PATH)
-                    pdf_files = [f for f in files if f['name'].lower().endswith('.pdf')]
-
-                    for file in pdf_files:
-                        file_name = file['name']
-                        file_id = file['id']
-                        local_path = os.path.join(LOCAL_INPUT_PDF_DIR, file_name)
-
-                        logging.info(f"[OneDrive] Processing {file_name}")
-                        download_file(headers, drive_id, file_id, local_path)
-                        pdf_type = classify_pdf(local_path)
-                        logging.info(f"[OneDrive] PDF type: {pdf_type}")
-                        process_pdf(local_path, pdf_type, headers, drive_id, file_id)
-                        move_file_to_folder(headers, drive_id, file_id, ONEDRIVE_PROCESSED_FOLDER)
-                        os.remove(local_path)
-                        processed_any = True
+                    # One small delta request per cycle; the full folder view is kept locally
+                    feed.poll(headers)
+                    passed_over.clear()
                 except Exception as e:
-                    logging.error(f"Failed to process from OneDrive: {e}")
+                    logging.error(f"Failed to check OneDrive for new files: {e}")
+                if leases and time.time() >= next_reclaim_time:
+                    # Lists every instance's claims, so it runs less often than the poll
+                    next_reclaim_time = time.time() + config.LEASE_RECLAIM_INTERVAL
+                    try:
+                        leases.reclaim_expired()
+                    except Exception as e:
+                        logging.error(f"Failed to reclaim expired work claims: {e}")
+
+            if headers and drive_id:
+                batch = []
+                for file in feed.files():
+                    if len(pipeline) + len(batch) >= max_in_flight:
+                        break
+                    if not file['name'].lower().endswith('.pdf') or file['id'] in passed_over:
+                        continue
+                    if onedrive_job_key(file) not in pipeline:
+                        batch.append(file)
+                # Delta entries carry no download URL: look the batch up in one $batch request
+                # rather than letting each download fetch its own item
+                missing = [file['id'] for file in batch if "@microsoft.graph.downloadUrl" not in file]
+                if len(missing) > 1:
+                    try:
+                        found = get_items(headers, drive_id, missing)
+                        batch = [found[file['id']] if isinstance(found.get(file['id']), dict) else file for file in batch]
+                    except Exception as e:
+                        logging.warning(f"[OneDrive] Could not look up {len(missing)} file(s) in one batch: {e}")
+                for file in batch:
+                    try:
+                        submit(onedrive_job_key(file), os.path.join(LOCAL_DOWNLOAD_DIR, file['name']), file)
+                    except Exception as e:
+                        passed_over.add(file['id'])
+                        logging.error(f"[OneDrive] Could not claim {file['name']}: {e}")
 
             # === Local Processing ===
-            local_files = [f for f in os.listdir(LOCAL_INPUT_PDF_DIR) if f.lower().endswith('.pdf')]
-            for fname in local_files:
+            for fname in watcher.take_ready():
                 local_path = os.path.join(LOCAL_INPUT_PDF_DIR, fname)
-                pdf_type = classify_pdf(local_path)
-                logging.info(f"[Local] {fname} classified as: {pdf_type}")
-                process_pdf(local_path, pdf_type)
                 try:
-                    dest_path = os.path.join(LOCAL_PROCESSED_DIR, fname)
-                    os.rename(local_path, dest_path)
-                    logging.info(f"Moved processed file to {LOCAL_PROCESSED_DIR}: {fname}")
-                    logging.info("")
-                except Exception as e:
-                    logging.error(f"Failed to move processed file: {fname} -> {e}")
-                processed_any = True
-
-            if not processed_any:
-                logging.info(" No files to process.")
+                    submit(local_job_key(local_path), local_path)
+                except OSError as e:
+                    logging.error(f"[Local] Could not read {fname}: {e}")
+
+            # === Finished Files ===
+            for job in pipeline.completed():
+                source = "[OneDrive]" if job.item else "[Local]"
+                if job.error:
+                    # Not moved: OneDrive files stay in the feed and are retried after the next poll
+                    attempts = journal.fail(job.key, f"{job.failed_stage}: {job.error}")
+                    if job.item:
+                        passed_over.add(job.item['id'])
+                    if attempts >= config.JOB_MAX_ATTEMPTS:
+                        logging.error(f"{source} Giving up on {job.name} after {attempts} failed attempts")
+                    if job.item and leases:
+                        try:
+                            # Back into "Files to Process"; the change feed reports it again from there
+                            leases.release(job.item)
+                            feed.discard(job.item['id'])
+                        except Exception as e:
+                            logging.error(f"{source} Could not hand back {job.name}: {e}")
+                    continue
+                logging.info(f"{source} {os.path.basename(job.path)} classified as: {job.result[0]}")
+                if not first_file_logged:
+                    logging.info(f" Startup: first file processed after {time.perf_counter() - STARTED_AT:.2f}s")
+                    first_file_logged = True
+                if job.item:
+                    if leases:
+                        leases.done(job.item)
+                    feed.discard(job.item['id'])
+                    if os.path.exists(job.path):
+                        os.remove(job.path)
 
             # === Upload Logs Periodically ===
             now = time.time()
@@ -213,13 +325,37 @@ def monitor():
                 except Exception as e:
                     logging.error(f"Failed to upload log file: {e}")
 
-            logging.info("Sleeping for 30 seconds...\n")
-            time.sleep(30)
+            if not first_poll_logged:
+                logging.info(f" Startup: first poll done after {time.perf_counter() - STARTED_AT:.2f}s")
+                first_poll_logged = True
+
+            # While files are in flight, wake up every second to collect them; otherwise
+            # return as soon as a local PDF finishes writing, or for the next OneDrive poll
+            if pipeline.busy:
+                watcher.wait(1)
+            else:
+                logging.info("Waiting for new files...\n")
+                watcher.wait(config.POLL_INTERVAL if headers and drive_id else None)
 
     except KeyboardInterrupt:
         logging.info(" Monitor stopped by user.")
     except Exception as e:
         logging.error(f"Monitor crashed: {e}", exc_info=True)
+    finally:
+        pipeline.close()
+        pool.close()
+        watcher.close()
+        journal.close()
+        if leases:
+            # Files still claimed were dropped with the pipeline; hand them to the other instances
+            leases.close()
+        # Final log upload attempt
+        if headers and drive_id:
+            try:
+                upload_log_file(headers, drive_id, log_file, ONEDRIVE_LOG_FOLDER)
+            except Exception:
+                pass
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     monitor()
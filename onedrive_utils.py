@@ -1,9 +1,26 @@
+import io
 import os
+import json
+import time
+import random
+import base64
+import hashlib
 import requests
 import logging
+import threading
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
 from dotenv import load_dotenv
-from config import LOCAL_ROOT_FOLDER,LOCAL_FILES_TO_PROCESS, LOCAL_OUTPUT_FILES, LOCAL_PROCESSED_FILES, LOCAL_LOG_FILES
+from config import LOCAL_ROOT_FOLDER,LOCAL_FILES_TO_PROCESS, LOCAL_OUTPUT_FILES, LOCAL_PROCESSED_FILES, LOCAL_LOG_FILES, DELTA_STATE_FILE
+from config import GRAPH_POOL_SIZE, GRAPH_TOKEN_REFRESH_MARGIN, GRAPH_TOKEN_CACHE_FILE
+from config import GRAPH_CONNECT_TIMEOUT, GRAPH_READ_TIMEOUT, GRAPH_MAX_RETRIES
+from config import GRAPH_CONCURRENCY_INITIAL, GRAPH_CONCURRENCY_MAX, GRAPH_LATENCY_TARGET
+from config import GRAPH_METADATA_TTL, GRAPH_METADATA_CACHE_FILE
+from config import UPLOAD_SESSION_THRESHOLD, UPLOAD_CHUNK_SIZE, UPLOAD_MAX_RETRIES, UPLOAD_SESSION_STATE_FILE, UPLOAD_PARALLEL_FILES
+from config import DOWNLOAD_BUFFER_SIZE, DOWNLOAD_PARALLEL_THRESHOLD, DOWNLOAD_SEGMENT_SIZE, DOWNLOAD_CONNECTIONS
+from config import DOWNLOAD_VERIFY_HASH
+from config import GRAPH_BATCH_SIZE, GRAPH_BATCH_UPLOAD_MAX_BYTES, GRAPH_BATCH_MAX_RETRIES
 
 load_dotenv()
 
@@ -18,10 +35,18 @@ TARGET_FOLDER_PATH = f"{ROOT_FOLDER}/Files to Process"
 ONEDRIVE_EXPORT_FOLDER = f"{ROOT_FOLDER}/Output Files"
 ONEDRIVE_PROCESSED_FOLDER = f"{ROOT_FOLDER}/Processed Files"
 ONEDRIVE_LOG_FOLDER = f"{ROOT_FOLDER}/Log Files"
+ONEDRIVE_IN_PROGRESS_FOLDER = f"{ROOT_FOLDER}/In Progress"
 
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
 
+try:
+    import fcntl
+except ImportError:  # Windows: the shared token cache still works, just without the refresh lock
+    fcntl = None
 
-def get_access_token():
+
+# === Token and Session Handling ===
+def request_access_token(session=None):
     url = f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token"
     data = {
         "client_id": CLIENT_ID,
@@ -29,9 +54,245 @@ def get_access_token():
         "client_secret": CLIENT_SECRET,
         "grant_type": "client_credentials"
     }
-    response = requests.post(url, data=data)
+    response = (session or requests).post(url, data=data, timeout=(GRAPH_CONNECT_TIMEOUT, GRAPH_READ_TIMEOUT))
     response.raise_for_status()
-    return response.json().get("access_token")
+    body = response.json()
+    return body.get("access_token"), int(body.get("expires_in", 3599))
+
+# === Throttling ===
+RETRY_STATUSES = (429, 502, 503, 504)
+THROTTLE_DECREASE = 0.7  # multiplicative cut applied to the concurrency limit when throttled
+THROTTLE_HOLD_SECONDS = 3  # no growth for this long after a cut, so the limit settles below the tenant's ceiling
+
+def retry_after_seconds(resp, attempt):
+    """Seconds to wait before retrying resp: its Retry-After if given, else exponential backoff with jitter."""
+    try:
+        return max(0.0, float(resp.headers.get("Retry-After")))
+    except (AttributeError, TypeError, ValueError):
+        return min(2 ** attempt, 60) + random.uniform(0, 1)
+
+class AdaptiveLimiter:
+    """AIMD cap on the number of Graph calls in flight.
+
+    Every fast response raises the cap by 1/cap (about one extra slot per round of calls).
+    Throttling cuts it by THROTTLE_DECREASE, at most once per second so a burst of 429s counts
+    as one signal, and holds every caller until the server's Retry-After has passed.
+    """
+
+    def __init__(self, initial=GRAPH_CONCURRENCY_INITIAL, maximum=GRAPH_CONCURRENCY_MAX,
+                 latency_target=GRAPH_LATENCY_TARGET, minimum=1):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self._in_flight < int(self.limit):
+                    self._in_flight += 1
+                    return
+                else:
+                    self._cond.wait()
+
+    def release(self, latency=None):
+        with self._cond:
+            self._in_flight -= 1
+            settled = time.monotonic() - self._last_decrease > THROTTLE_HOLD_SECONDS
+            if latency is not None and latency <= self.latency_target and settled:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def backoff(self, retry_after=None):
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= 1:
+                self.limit = max(self.minimum, self.limit * THROTTLE_DECREASE)
+                self._last_decrease = now
+                logging.warning(f" Graph is throttling – concurrency limit lowered to {int(self.limit)}")
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._cond.notify_all()
+
+class GraphClient:
+    """One keep-alive Graph session per process plus an app token cached until just before it expires.
+
+    The token is also written to a small file so other monitor processes on the same host
+    reuse it instead of each fetching their own, and it is refreshed in the background.
+    """
+
+    def __init__(self, pool_size=GRAPH_POOL_SIZE, token_cache_file=GRAPH_TOKEN_CACHE_FILE,
+                 refresh_margin=GRAPH_TOKEN_REFRESH_MARGIN):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.token_cache_file = token_cache_file
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._timer = None
+        self.limiter = AdaptiveLimiter()
+
+    # --- shared on-disk cache ---
+    def _cache_key(self):
+        return f"{TENANT_ID}:{CLIENT_ID}"
+
+    def _read_shared_token(self):
+        try:
+            with open(self.token_cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None, 0
+        if cached.get("key") != self._cache_key():
+            return None, 0
+        return cached.get("access_token"), cached.get("expires_at", 0)
+
+    def _write_shared_token(self, token, expires_at):
+        os.makedirs(os.path.dirname(self.token_cache_file), exist_ok=True)
+        tmp_path = f"{self.token_cache_file}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"key": self._cache_key(), "access_token": token, "expires_at": expires_at}, f)
+        os.replace(tmp_path, self.token_cache_file)
+
+    def _fresh(self, expires_at):
+        return time.time() < expires_at - self.refresh_margin
+
+    def _refresh_locked(self, force=False):
+        lock_file = None
+        if fcntl is not None:
+            # Serialise refreshes across processes so only one of them calls the token endpoint
+            os.makedirs(os.path.dirname(self.token_cache_file), exist_ok=True)
+            lock_file = open(self.token_cache_file + ".lock", "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            token, expires_at = self._read_shared_token()
+            # On a forced refresh another process may already have replaced the rejected token
+            stale = not token or not self._fresh(expires_at) or (force and token == self._token)
+            if stale:
+                token, expires_in = request_access_token(self.session)
+                expires_at = time.time() + expires_in
+                try:
+                    self._write_shared_token(token, expires_at)
+                except OSError as e:
+                    logging.warning(f" Could not write shared token cache: {e}")
+            self._token, self._expires_at = token, expires_at
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+        self._schedule_refresh()
+
+    def _schedule_refresh(self, delay=None):
+        if self._timer is not None:
+            self._timer.cancel()
+        if delay is None:
+            delay = max(1, self._expires_at - self.refresh_margin - time.time())
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                self._refresh_locked()
+        except Exception as e:
+            logging.warning(f" Background token refresh failed, retrying in 30s: {e}")
+            self._schedule_refresh(30)
+
+    def get_token(self, force=False):
+        with self._lock:
+            if force or not self._token or not self._fresh(self._expires_at):
+                self._refresh_locked(force=force)
+            return self._token
+
+    # --- HTTP ---
+    def request(self, method, url, headers=None, authorize=True, max_retries=GRAPH_MAX_RETRIES, **kwargs):
+        """Send one call through the concurrency limiter with timeouts.
+
+        Throttling and gateway errors are retried after their Retry-After and dropped connections
+        with backoff, as long as the body can be sent again. Pre-authenticated URLs (downloads,
+        upload sessions) pass authorize=False so no bearer token is attached.
+        """
+        kwargs.setdefault("timeout", (GRAPH_CONNECT_TIMEOUT, GRAPH_READ_TIMEOUT))
+        body = kwargs.get("data")
+        start = body.tell() if hasattr(body, "seek") else None
+        replayable = start is not None or not hasattr(body, "read")
+        merged = dict(headers or {})
+        force_token = False
+        attempt = 0
+        while True:
+            if start is not None:
+                body.seek(start)
+            if authorize:
+                merged["Authorization"] = f"Bearer {self.get_token(force=force_token)}"
+            self.limiter.acquire()
+            sent_at = time.monotonic()
+            try:
+                resp = self.session.request(method, url, headers=merged, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.limiter.release()
+                if isinstance(e, requests.Timeout):
+                    self.limiter.backoff()
+                if attempt >= max_retries or not replayable:
+                    raise
+                delay = retry_after_seconds(None, attempt)
+                logging.warning(f" {method} {url.split('?')[0]} failed ({e.__class__.__name__}), retrying in {delay:.0f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if resp.status_code not in RETRY_STATUSES:
+                self.limiter.release(time.monotonic() - sent_at)
+            else:
+                self.limiter.release()
+                self.limiter.backoff(retry_after_seconds(resp, attempt))
+
+            if resp.status_code in RETRY_STATUSES and attempt < max_retries and replayable:
+                logging.warning(f" {method} {url.split('?')[0]} returned {resp.status_code}, retrying")
+                resp.close()
+                attempt += 1
+                continue
+            # A revoked/rotated token: refresh once, unless the body was a stream we cannot rewind
+            if resp.status_code == 401 and authorize and not force_token and replayable:
+                force_token = True
+                continue
+            return resp
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GraphClient()
+        return _client
+
+
+def get_access_token():
+    return get_client().get_token()
 
 def get_headers():
     token = get_access_token()
@@ -40,54 +301,621 @@ def get_headers():
         "Content-Type": "application/json"
     }
 
-def get_drive_id(headers, user_email):
+# === Metadata Cache ===
+class MetadataCache:
+    """TTL cache for Graph ids that almost never change (drive ids, folder path → id).
+
+    Held in memory and, when a cache file is configured, mirrored to disk so a restarted
+    monitor does not have to look them up again. Callers invalidate an entry on 404.
+    """
+
+    def __init__(self, ttl=GRAPH_METADATA_TTL, cache_file=GRAPH_METADATA_CACHE_FILE):
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save_locked(self):
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            logging.warning(f" Could not write Graph metadata cache: {e}")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.time():
+                return entry[0]
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = [value, time.time() + self.ttl]
+            self._save_locked()
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save_locked()
+
+    def get_or_fetch(self, key, fetch):
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+metadata_cache = MetadataCache()
+
+def drive_cache_key(user_email):
+    return f"drive:{str(user_email).lower()}"
+
+def folder_cache_key(drive_id, folder_path):
+    return f"folder:{drive_id}:{folder_path.strip('/').lower()}"
+
+def fetch_drive_id(headers, user_email):
     url = f"https://graph.microsoft.com/v1.0/users/{user_email}/drive"
-    resp = requests.get(url, headers=headers)
+    resp = get_client().get(url, headers=headers)
     resp.raise_for_status()
     return resp.json().get('id')
 
+def get_drive_id(headers, user_email):
+    return metadata_cache.get_or_fetch(drive_cache_key(user_email), lambda: fetch_drive_id(headers, user_email))
+
 def get_text_drive_id(headers):
-    url = f"https://graph.microsoft.com/v1.0/users/{USER_ID}/drive"
-    resp = requests.get(url, headers=headers)
-    resp.raise_for_status()
-    return resp.json().get('id')
+    return get_drive_id(headers, USER_ID)
+
+def invalidate_drive_id(user_email):
+    metadata_cache.invalidate(drive_cache_key(user_email))
+
+def get_all_pages(headers, url):
+    items = []
+    while url:
+        resp = get_client().get(url, headers=headers)
+        resp.raise_for_status()
+        data = resp.json()
+        items.extend(data.get("value", []))
+        url = data.get("@odata.nextLink")
+    return items
 
 def list_folder_files(headers, drive_id, folder_path):
     encoded_path = quote(folder_path)
     url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{encoded_path}:/children"
-    resp = requests.get(url, headers=headers)
+    return get_all_pages(headers, url)
+
+def fetch_folder_id(headers, drive_id, folder_path):
+    url = f"{GRAPH_URL}/drives/{drive_id}/root:/{quote(folder_path)}"
+    resp = get_client().get(url, headers=headers)
+    resp.raise_for_status()
+    return resp.json()["id"]
+
+def get_folder_id(headers, drive_id, folder_path):
+    key = folder_cache_key(drive_id, folder_path)
+    return metadata_cache.get_or_fetch(key, lambda: fetch_folder_id(headers, drive_id, folder_path))
+
+def invalidate_folder_id(drive_id, folder_path):
+    metadata_cache.invalidate(folder_cache_key(drive_id, folder_path))
+
+def create_folder(headers, drive_id, folder_path):
+    """Create folder_path (and any missing parents); returns its id, also if it already existed."""
+    parent, _, name = folder_path.rpartition("/")
+    url = f"{GRAPH_URL}/drives/{drive_id}/root:/{quote(parent)}:/children" if parent else f"{GRAPH_URL}/drives/{drive_id}/root/children"
+    body = {"name": name, "folder": {}, "@microsoft.graph.conflictBehavior": "fail"}
+    resp = get_client().post(url, headers=headers, json=body)
+    if resp.status_code == 404 and parent:
+        create_folder(headers, drive_id, parent)
+        resp = get_client().post(url, headers=headers, json=body)
+    if resp.status_code == 409:
+        return fetch_folder_id(headers, drive_id, folder_path)  # created by someone else in the meantime
+    resp.raise_for_status()
+    return resp.json()["id"]
+
+def ensure_folder(headers, drive_id, folder_path):
+    """Cached id of folder_path, creating the folder if it does not exist yet."""
+    def fetch():
+        try:
+            return fetch_folder_id(headers, drive_id, folder_path)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            return create_folder(headers, drive_id, folder_path)
+    return metadata_cache.get_or_fetch(folder_cache_key(drive_id, folder_path), fetch)
+
+class FolderDeltaFeed:
+    """Incremental view of one OneDrive folder built on Graph delta queries.
+
+    The first poll lists the folder once; later polls only fetch what changed since the
+    saved delta token. Delta is requested on the drive root (OneDrive for Business does not
+    support it on sub-folders) and filtered to children of the watched folder by parent id.
+    """
+
+    def __init__(self, drive_id, folder_path, state_file=DELTA_STATE_FILE):
+        self.drive_id = drive_id
+        self.folder_path = folder_path
+        self.state_file = state_file
+        self.folder_id = None
+        self.delta_link = None
+        self.items = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("drive_id") != self.drive_id or state.get("folder_path") != self.folder_path:
+            return
+        self.folder_id = state.get("folder_id")
+        self.delta_link = state.get("delta_link")
+        self.items = state.get("items", {})
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        state = {
+            "drive_id": self.drive_id,
+            "folder_path": self.folder_path,
+            "folder_id": self.folder_id,
+            "delta_link": self.delta_link,
+            "items": self.items
+        }
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_file)
+
+    def _seed(self, headers):
+        self.folder_id = get_folder_id(headers, self.drive_id, self.folder_path)
+        # Take the latest token before listing so changes made during the listing are not missed
+        resp = get_client().get(f"{GRAPH_URL}/drives/{self.drive_id}/root/delta?token=latest", headers=headers)
+        resp.raise_for_status()
+        self.delta_link = resp.json().get("@odata.deltaLink")
+        children = list_folder_files(headers, self.drive_id, self.folder_path)
+        self.items = {item["id"]: item for item in children if "file" in item}
+        logging.info(f" Delta feed seeded with {len(self.items)} item(s) from {self.folder_path}")
+        return list(self.items.values())
+
+    def _apply_delta(self, headers):
+        changed = {}
+        url = self.delta_link
+        while url:
+            resp = get_client().get(url, headers=headers)
+            resp.raise_for_status()
+            data = resp.json()
+            for item in data.get("value", []):
+                item_id = item.get("id")
+                if item_id == self.folder_id and "deleted" in item:
+                    # Watched folder was removed; start over from a fresh listing next time
+                    invalidate_folder_id(self.drive_id, self.folder_path)
+                    self.delta_link = None
+                    return []
+                in_folder = item.get("parentReference", {}).get("id") == self.folder_id
+                if "deleted" in item or "file" not in item or not in_folder:
+                    self.items.pop(item_id, None)
+                    changed.pop(item_id, None)
+                else:
+                    self.items[item_id] = item
+                    changed[item_id] = item
+            url = data.get("@odata.nextLink")
+            if "@odata.deltaLink" in data:
+                self.delta_link = data["@odata.deltaLink"]
+        return list(changed.values())
+
+    def poll(self, headers):
+        """Fetch changes since the last poll and return the files added or changed in the folder."""
+        if not self.delta_link or not self.folder_id:
+            changed = self._seed(headers)
+        else:
+            try:
+                changed = self._apply_delta(headers)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 410:
+                    raise
+                logging.warning(" Delta token expired – re-listing folder")
+                changed = self._seed(headers)
+        self._save()
+        return changed
+
+    def files(self):
+        """All files currently known to be in the folder, including ones left over from earlier cycles."""
+        return list(self.items.values())
+
+    def discard(self, item_id):
+        # Called after we move an item out, so it is not offered again before the delta catches up
+        if self.items.pop(item_id, None) is not None:
+            self._save()
+
+# === Downloads ===
+class DownloadUrlExpired(Exception):
+    pass
+
+class RangeNotSupported(Exception):
+    pass
+
+class QuickXorHash:
+    """OneDrive for Business quickXorHash: each byte is XORed into a 160-bit register at bit (11 * index) mod 160."""
+
+    WIDTH_BYTES = 20
+    BLOCK = 160  # byte positions repeat every 160 bytes, so whole blocks can be XOR-folded together
+
+    def __init__(self):
+        self._acc = 0
+        self._length = 0
+
+    @staticmethod
+    def _fold(data):
+        blocks = -(-len(data) // QuickXorHash.BLOCK)
+        x = int.from_bytes(data, "little")
+        while blocks > 1:
+            half = blocks // 2
+            shift = half * QuickXorHash.BLOCK * 8
+            x = (x & ((1 << shift) - 1)) ^ (x >> shift)
+            blocks -= half
+        return x
+
+    def update(self, data):
+        lead = self._length % self.BLOCK
+        if lead:
+            data = bytes(lead) + bytes(data)
+        self._acc ^= self._fold(data)
+        self._length += len(data) - lead
+
+    def digest(self):
+        mask = (1 << 160) - 1
+        register = 0
+        for index, value in enumerate(self._acc.to_bytes(self.BLOCK, "little")):
+            if value:
+                shifted = value << ((index * 11) % 160)
+                register ^= (shifted & mask) | (shifted >> 160)
+        out = bytearray(register.to_bytes(self.WIDTH_BYTES, "little"))
+        for i, b in enumerate(self._length.to_bytes(8, "little")):
+            out[self.WIDTH_BYTES - 8 + i] ^= b
+        return bytes(out)
+
+    def b64digest(self):
+        return base64.b64encode(self.digest()).decode("ascii")
+
+def _verify_content(chunks, actual_size, item):
+    expected_size = item.get("size")
+    if expected_size is not None and actual_size != expected_size:
+        raise IOError(f"Size mismatch for {item.get('name')}: expected {expected_size}, got {actual_size}")
+    if not DOWNLOAD_VERIFY_HASH:
+        return
+    hashes = item.get("file", {}).get("hashes", {})
+    if hashes.get("sha256Hash"):
+        hasher, expected, encode = hashlib.sha256(), hashes["sha256Hash"].lower(), lambda h: h.hexdigest()
+    elif hashes.get("sha1Hash"):
+        hasher, expected, encode = hashlib.sha1(), hashes["sha1Hash"].lower(), lambda h: h.hexdigest()
+    elif hashes.get("quickXorHash"):
+        hasher, expected, encode = QuickXorHash(), hashes["quickXorHash"], lambda h: h.b64digest()
+    else:
+        return
+    for chunk in chunks:
+        hasher.update(chunk)
+    if encode(hasher) != expected:
+        raise IOError(f"Hash mismatch for {item.get('name')}")
+
+def verify_download(path, item):
+    def chunks():
+        with open(path, "rb") as f:
+            while chunk := f.read(DOWNLOAD_BUFFER_SIZE):
+                yield chunk
+    _verify_content(chunks(), os.path.getsize(path), item)
+
+def verify_bytes(data, item):
+    _verify_content([data], len(data), item)
+
+def get_item(headers, drive_id, item_id):
+    url = f"{GRAPH_URL}/drives/{drive_id}/items/{item_id}"
+    resp = get_client().get(url, headers=headers)
     resp.raise_for_status()
-    return resp.json().get("value", [])
+    return resp.json()
 
-def download_file(headers, drive_id, item_id, dest_path):
-    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{item_id}/content"
-    with requests.get(url, headers=headers, stream=True) as r:
+def _fetch_range(url, part_path, start, end=None, segment=False):
+    # @microsoft.graph.downloadUrl is pre-authenticated, so no bearer token is sent with it
+    range_headers = {"Range": f"bytes={start}-{'' if end is None else end}"} if start or end is not None else {}
+    with get_client().request("GET", url, authorize=False, headers=range_headers, stream=True) as r:
+        if r.status_code in (401, 403):
+            raise DownloadUrlExpired(r.status_code)
         r.raise_for_status()
-        with open(dest_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
+        if range_headers and r.status_code != 206:
+            if segment:
+                raise RangeNotSupported()
+            start = 0  # server sent the whole file; rewrite it from the top
+        with open(part_path, "r+b") as f:
+            f.seek(start)
+            if not segment:
+                f.truncate()
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_BUFFER_SIZE):
                 f.write(chunk)
 
-def move_file_to_folder(headers, drive_id, item_id, target_folder_path):
-    target_folder_encoded = quote(target_folder_path)
-    folder_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{target_folder_encoded}"
-    folder_resp = requests.get(folder_url, headers=headers)
-    folder_resp.raise_for_status()
-    folder_id = folder_resp.json()["id"]
+def _download_to_part(url, part_path, item, segmented=True):
+    size = item.get("size")
+    progress_path = part_path + ".progress"
+    tag = item.get("cTag") or item.get("eTag")
+    segmented = segmented and bool(size) and size >= DOWNLOAD_PARALLEL_THRESHOLD
+
+    # A partial file is only continued if it belongs to the same version of the item and the same mode
+    progress = None
+    try:
+        with open(progress_path, "r", encoding="utf-8") as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        pass
+    resumable = (
+        progress is not None and os.path.exists(part_path)
+        and progress.get("tag") == tag and progress.get("size") == size
+        and progress.get("segmented") == segmented
+    )
+    done = set(progress.get("segments", [])) if resumable else set()
+
+    def save_progress():
+        with open(progress_path, "w", encoding="utf-8") as f:
+            json.dump({"tag": tag, "size": size, "segmented": segmented, "segments": sorted(done)}, f)
+
+    if not resumable:
+        with open(part_path, "wb") as f:
+            if segmented:
+                f.truncate(size)  # preallocate so segments can be written in place
+        save_progress()
+
+    if not segmented:
+        offset = os.path.getsize(part_path)
+        if offset and size and offset >= size:
+            return
+        if offset:
+            logging.info(f" Resuming download of {item.get('name')} at byte {offset}")
+        _fetch_range(url, part_path, offset)
+        return
 
+    segments = [(start, min(start + DOWNLOAD_SEGMENT_SIZE, size) - 1) for start in range(0, size, DOWNLOAD_SEGMENT_SIZE)]
+    lock = threading.Lock()
+
+    def fetch(index):
+        start, end = segments[index]
+        _fetch_range(url, part_path, start, end, segment=True)
+        with lock:
+            done.add(index)
+            save_progress()
+
+    pending = [i for i in range(len(segments)) if i not in done]
+    if done:
+        logging.info(f" Resuming download of {item.get('name')}: {len(pending)} of {len(segments)} segment(s) left")
+    with ThreadPoolExecutor(max_workers=max(1, DOWNLOAD_CONNECTIONS)) as executor:
+        for future in [executor.submit(fetch, i) for i in pending]:
+            future.result()
+
+def download_file(headers, drive_id, item_id, dest_path, item=None):
+    """Download an item through its pre-authenticated URL, in parallel Range segments when large.
+
+    Pass the listing entry as item to skip the metadata lookup. Interrupted downloads resume
+    from dest_path + ".part", and the result is checked against the size and hash OneDrive reports.
+    """
+    part_path = dest_path + ".part"
+    segmented = True
+    for attempt in range(3):
+        if not item or "@microsoft.graph.downloadUrl" not in item:
+            item = get_item(headers, drive_id, item_id)
+        try:
+            _download_to_part(item["@microsoft.graph.downloadUrl"], part_path, item, segmented)
+            break
+        except DownloadUrlExpired:
+            # Listing URLs are short-lived; fetch a fresh one and carry on from the partial file
+            if attempt == 2:
+                raise
+            item = None
+        except RangeNotSupported:
+            segmented = False
+    try:
+        verify_download(part_path, item)
+    except IOError:
+        for path in (part_path, part_path + ".progress"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    os.replace(part_path, dest_path)
+    if os.path.exists(part_path + ".progress"):
+        os.remove(part_path + ".progress")
+
+def download_bytes(headers, drive_id, item_id, item=None):
+    """download_file() into memory: returns the item's content, checked against its size and hash.
+
+    Meant for files small enough to hold in memory, so it is one plain stream with no resume file.
+    """
+    for attempt in range(3):
+        if not item or "@microsoft.graph.downloadUrl" not in item:
+            item = get_item(headers, drive_id, item_id)
+        buffer = io.BytesIO()
+        try:
+            with get_client().request("GET", item["@microsoft.graph.downloadUrl"], authorize=False, stream=True) as r:
+                if r.status_code in (401, 403):
+                    raise DownloadUrlExpired(r.status_code)
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_BUFFER_SIZE):
+                    buffer.write(chunk)
+            break
+        except DownloadUrlExpired:
+            if attempt == 2:
+                raise
+            item = None
+    data = buffer.getvalue()
+    verify_bytes(data, item)
+    return data
+
+def move_file_to_folder(headers, drive_id, item_id, target_folder_path):
     move_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{item_id}"
-    move_data = {"parentReference": {"id": folder_id}}
-    move_resp = requests.patch(move_url, headers=headers, json=move_data)
+    for attempt in range(2):
+        folder_id = get_folder_id(headers, drive_id, target_folder_path)
+        move_data = {"parentReference": {"id": folder_id}}
+        move_resp = get_client().patch(move_url, headers=headers, json=move_data)
+        if move_resp.status_code == 404 and attempt == 0:
+            # The cached folder id may be stale (folder deleted and recreated) – look it up again
+            invalidate_folder_id(drive_id, target_folder_path)
+            continue
+        break
     move_resp.raise_for_status()
     logging.info(f"Moved OneDrive file to → {target_folder_path}")
     logging.info("\n")
 
+# === Uploads ===
+UPLOAD_FRAGMENT_UNIT = 320 * 1024  # Graph upload session chunks must be a multiple of this
+_upload_state_lock = threading.Lock()
+
+# Uploads take a local path or an in-memory file: any binary buffer with a .name, such as report_handlers.MemoryFile
+def _in_memory(source):
+    return hasattr(source, "getbuffer")
+
+def _source_name(source):
+    return source.name if _in_memory(source) else os.path.basename(source)
+
+def _source_size(source):
+    return source.getbuffer().nbytes if _in_memory(source) else os.path.getsize(source)
+
+def _read_upload_sessions():
+    try:
+        with open(UPLOAD_SESSION_STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _update_upload_session(key, entry):
+    with _upload_state_lock:
+        sessions = _read_upload_sessions()
+        if entry is None:
+            sessions.pop(key, None)
+        else:
+            sessions[key] = entry
+        try:
+            os.makedirs(os.path.dirname(UPLOAD_SESSION_STATE_FILE), exist_ok=True)
+            tmp_path = f"{UPLOAD_SESSION_STATE_FILE}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(sessions, f)
+            os.replace(tmp_path, UPLOAD_SESSION_STATE_FILE)
+        except OSError as e:
+            logging.warning(f" Could not save upload session state: {e}")
+
+def create_upload_session(headers, drive_url, remote_path):
+    url = f"{drive_url}/root:/{quote(remote_path)}:/createUploadSession"
+    body = {"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+    resp = get_client().post(url, headers=headers, json=body)
+    resp.raise_for_status()
+    return resp.json()["uploadUrl"]
+
+def _next_expected_offset(ranges, default):
+    if not ranges:
+        return default
+    return int(ranges[0].split("-")[0])
+
+def _query_upload_offset(upload_url):
+    # The upload URL is pre-authenticated, so it goes out on the bare session without a bearer token
+    resp = get_client().request("GET", upload_url, authorize=False)
+    if resp.status_code == 404:
+        return None
+    resp.raise_for_status()
+    return _next_expected_offset(resp.json().get("nextExpectedRanges"), 0)
+
+def upload_in_chunks(headers, drive_url, remote_path, local_path):
+    """Upload through a Graph upload session, resuming from the server's expected offset after a failure.
+
+    Chunks go in order, as Graph requires; the session URL is saved so a restart can continue it.
+    """
+    if _in_memory(local_path):
+        content = local_path.getvalue()
+        size = len(content)
+        fingerprint = {"size": size, "sha1": hashlib.sha1(content).hexdigest()}
+    else:
+        stat = os.stat(local_path)
+        size = stat.st_size
+        fingerprint = {"size": size, "mtime": stat.st_mtime}
+    chunk_size = max(UPLOAD_FRAGMENT_UNIT, UPLOAD_CHUNK_SIZE // UPLOAD_FRAGMENT_UNIT * UPLOAD_FRAGMENT_UNIT)
+    key = f"{drive_url}/{remote_path}"
+
+    saved = _read_upload_sessions().get(key)
+    offset = None
+    if saved and all(saved.get(field) == value for field, value in fingerprint.items()):
+        upload_url = saved["url"]
+        try:
+            offset = _query_upload_offset(upload_url)
+        except requests.RequestException:
+            offset = None
+        if offset is not None:
+            logging.info(f" Resuming upload of {_source_name(local_path)} at byte {offset}")
+    if offset is None:
+        upload_url = create_upload_session(headers, drive_url, remote_path)
+        _update_upload_session(key, {"url": upload_url, **fingerprint})
+        offset = 0
+
+    failures = 0
+    with (io.BytesIO(content) if _in_memory(local_path) else open(local_path, "rb")) as f:
+        while True:
+            f.seek(offset)
+            # Never past the size the session was opened with: the monitor log keeps growing while it is uploaded
+            chunk = f.read(min(chunk_size, size - offset))
+            end = offset + len(chunk) - 1
+            chunk_headers = {"Content-Length": str(len(chunk)), "Content-Range": f"bytes {offset}-{end}/{size}"}
+            error = None
+            try:
+                # Failures are retried below, after asking the session where to resume
+                resp = get_client().request("PUT", upload_url, authorize=False, max_retries=0,
+                                            headers=chunk_headers, data=chunk)
+            except requests.RequestException as e:
+                resp, error = None, e
+
+            if resp is not None and resp.status_code in (200, 201):
+                _update_upload_session(key, None)
+                return resp
+            if resp is not None and resp.status_code == 202:
+                offset = _next_expected_offset(resp.json().get("nextExpectedRanges"), end + 1)
+                failures = 0
+                continue
+
+            failures += 1
+            if failures > UPLOAD_MAX_RETRIES:
+                if resp is not None:
+                    return resp
+                raise error
+            time.sleep(min(2 ** failures, 30))
+            try:
+                resumed_at = _query_upload_offset(upload_url)
+            except requests.RequestException:
+                continue  # keep the same offset and try the chunk again
+            if resumed_at is None:
+                # Session expired or was discarded – start a new one from the beginning
+                upload_url = create_upload_session(headers, drive_url, remote_path)
+                _update_upload_session(key, {"url": upload_url, **fingerprint})
+                resumed_at = 0
+            offset = resumed_at
+
+def put_file(headers, drive_url, remote_path, local_path):
+    """Upload local_path (or an in-memory file) to remote_path on the drive at drive_url; large files use an upload session."""
+    if _source_size(local_path) > UPLOAD_SESSION_THRESHOLD:
+        return upload_in_chunks(headers, drive_url, remote_path, local_path)
+    url = f"{drive_url}/root:/{quote(remote_path)}:/content"
+    if _in_memory(local_path):
+        return get_client().put(url, headers=headers, data=local_path.getvalue())
+    with open(local_path, "rb") as f:
+        return get_client().put(url, headers=headers, data=f)
+
 def upload_file_to_onedrive(local_path, onedrive_folder):
-    headers = {"Authorization": f"Bearer {get_access_token()}"}
     file_name = os.path.basename(local_path)
-    encoded_path = quote(f"{onedrive_folder}/{file_name}")
-    url = f"https://graph.microsoft.com/v1.0/users/{USER_ID}/drive/root:/{encoded_path}:/content"
-    with open(local_path, "rb") as f:
-        resp = requests.put(url, headers=headers, data=f)
+    resp = put_file(None, f"{GRAPH_URL}/users/{USER_ID}/drive", f"{onedrive_folder}/{file_name}", local_path)
     if resp.ok:
         logging.info(f"Uploaded to OneDrive → {file_name}")
         return True
@@ -98,11 +926,202 @@ def upload_file_to_onedrive(local_path, onedrive_folder):
 def upload_log_file(headers, drive_id, local_log_path, target_onedrive_folder):
     file_name = os.path.basename(local_log_path)
     target_path = f"{target_onedrive_folder}/{file_name}"
-    encoded = quote(target_path)
-    with open(local_log_path, 'rb') as f:
-        url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{encoded}:/content"
-        response = requests.put(url, headers=headers, data=f)
+    response = put_file(headers, f"{GRAPH_URL}/drives/{drive_id}", target_path, local_log_path)
     if response.ok:
         logging.info(" Log uploaded to OneDrive")
     else:
         logging.error(f" Log upload failed: {response.status_code} - {response.text}")
+
+# === JSON Batching ===
+BATCH_PAYLOAD_BUDGET = 3 * 1024 * 1024  # keep each $batch body well under Graph's 4 MB request limit
+BATCH_RETRY_STATUSES = (429, 503, 504)
+
+class BatchResponse:
+    """One entry of a $batch reply, shaped like the parts of requests.Response the callers use."""
+
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.body if isinstance(self.body, str) else json.dumps(self.body)
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if not self.ok:
+            error = (self.body or {}).get("error", {}) if isinstance(self.body, dict) else {}
+            message = error.get("message") or self.text
+            raise requests.HTTPError(f"{self.status_code} Error: {message}", response=self)
+
+class GraphBatch:
+    """Collects independent Graph calls and sends them as $batch requests of up to GRAPH_BATCH_SIZE.
+
+    Each add() returns an id; execute() returns {id: BatchResponse}. Entries that come back
+    throttled are resent in a later batch after the Retry-After they asked for.
+    """
+
+    def __init__(self, headers=None, batch_size=GRAPH_BATCH_SIZE):
+        self.headers = headers
+        self.batch_size = batch_size
+        self._requests = []
+
+    def __len__(self):
+        return len(self._requests)
+
+    def add(self, method, url, body=None, headers=None):
+        request_id = str(len(self._requests) + 1)
+        entry = {"id": request_id, "method": method, "url": url[len(GRAPH_URL):] if url.startswith(GRAPH_URL) else url}
+        if body is not None:
+            entry["body"] = body
+            entry["headers"] = {"Content-Type": "application/json"}
+        if headers:
+            entry.setdefault("headers", {}).update(headers)
+        self._requests.append(entry)
+        return request_id
+
+    def _chunks(self, entries):
+        chunk, size = [], 0
+        for entry in entries:
+            entry_size = len(entry["body"]) if isinstance(entry.get("body"), str) else 0
+            if chunk and (len(chunk) >= self.batch_size or size + entry_size > BATCH_PAYLOAD_BUDGET):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(entry)
+            size += entry_size
+        if chunk:
+            yield chunk
+
+    def _send(self, chunk):
+        resp = get_client().post(f"{GRAPH_URL}/$batch", headers=self.headers, json={"requests": chunk})
+        resp.raise_for_status()
+        return {r["id"]: BatchResponse(r.get("status", 500), r.get("headers"), r.get("body"))
+                for r in resp.json().get("responses", [])}
+
+    def execute(self, max_retries=GRAPH_BATCH_MAX_RETRIES):
+        results = {}
+        pending = list(self._requests)
+        for attempt in range(max_retries + 1):
+            retry, wait = [], 0
+            for chunk in self._chunks(pending):
+                responses = self._send(chunk)
+                for entry in chunk:
+                    result = responses.get(entry["id"], BatchResponse(500, body="Missing from $batch response"))
+                    results[entry["id"]] = result
+                    if result.status_code in BATCH_RETRY_STATUSES:
+                        retry.append(entry)
+                        wait = max(wait, int(result.headers.get("Retry-After", 2 ** attempt)))
+            if not retry or attempt == max_retries:
+                break
+            logging.warning(f" {len(retry)} batched request(s) throttled, retrying in {wait}s")
+            # The limiter holds every Graph call, this batch included, until Retry-After has passed
+            get_client().limiter.backoff(wait)
+            pending = retry
+        self._requests = []
+        return results
+
+def _batch_error(result):
+    try:
+        result.raise_for_status()
+    except requests.HTTPError as e:
+        return e
+    return None
+
+def get_items(headers, drive_id, item_ids):
+    """Look up several drive items at once: returns {item_id: item dict or exception}."""
+    batch = GraphBatch(headers)
+    ids = {item_id: batch.add("GET", f"/drives/{drive_id}/items/{item_id}") for item_id in item_ids}
+    results = batch.execute()
+    return {item_id: _batch_error(results[rid]) or results[rid].json() for item_id, rid in ids.items()}
+
+def move_files_to_folder(headers, drive_id, item_ids, target_folder_path):
+    """Batched move_file_to_folder: returns {item_id: None on success or the exception}."""
+    errors = {}
+    pending = list(item_ids)
+    for attempt in range(2):
+        if not pending:
+            break
+        folder_id = get_folder_id(headers, drive_id, target_folder_path)
+        batch = GraphBatch(headers)
+        ids = {item_id: batch.add("PATCH", f"/drives/{drive_id}/items/{item_id}", {"parentReference": {"id": folder_id}})
+               for item_id in pending}
+        results = batch.execute()
+        errors.update({item_id: _batch_error(results[rid]) for item_id, rid in ids.items()})
+        pending = [item_id for item_id, rid in ids.items() if results[rid].status_code == 404]
+        if pending and attempt == 0:
+            # The cached folder id may be stale (folder deleted and recreated) – look it up again
+            invalidate_folder_id(drive_id, target_folder_path)
+    moved = sum(1 for e in errors.values() if e is None)
+    if moved:
+        logging.info(f"Moved {moved} OneDrive file(s) to → {target_folder_path}")
+    return errors
+
+def put_files(headers, drive_url, uploads):
+    """Upload several (remote_path, local_path) pairs: returns {local_path: None on success or the exception}.
+
+    Small files travel inside $batch requests as base64 bodies; larger ones use put_file, up to
+    UPLOAD_PARALLEL_FILES of them at once. local_path may also be an in-memory file, which is
+    uploaded straight from its buffer.
+    """
+    def put_one(remote_path, local_path):
+        try:
+            put_file(headers, drive_url, remote_path, local_path).raise_for_status()
+            return None
+        except Exception as e:
+            return e
+
+    errors = {}
+    batch = GraphBatch(headers)
+    ids = {}
+    large = []
+    for remote_path, local_path in uploads:
+        if _source_size(local_path) > GRAPH_BATCH_UPLOAD_MAX_BYTES:
+            large.append((remote_path, local_path))
+            continue
+        if _in_memory(local_path):
+            content = base64.b64encode(local_path.getvalue()).decode("ascii")
+        else:
+            with open(local_path, "rb") as f:
+                content = base64.b64encode(f.read()).decode("ascii")
+        url = f"{drive_url}/root:/{quote(remote_path)}:/content"
+        ids[local_path] = batch.add("PUT", url, content, headers={"Content-Type": "application/octet-stream"})
+    with ThreadPoolExecutor(max_workers=max(1, min(UPLOAD_PARALLEL_FILES, len(large) or 1))) as executor:
+        futures = {local_path: executor.submit(put_one, remote_path, local_path) for remote_path, local_path in large}
+        results = batch.execute()
+        errors.update({local_path: future.result() for local_path, future in futures.items()})
+    errors.update({local_path: _batch_error(results[rid]) for local_path, rid in ids.items()})
+    return errors
+
+def publish_results(headers, drive_id, results, export_folder, processed_folder, on_uploaded=None):
+    """Upload the outputs of a cycle's finished files and move those files to processed_folder.
+
+    results is a list of (item, output_paths). A file is only moved, and on_uploaded(item) called,
+    once all of its outputs are uploaded. Returns {item_id: None on success or the exception}.
+    """
+    drive_url = f"{GRAPH_URL}/drives/{drive_id}"
+    uploads = [(f"{export_folder}/{_source_name(path)}", path) for _, outputs in results for path in outputs]
+    upload_errors = put_files(headers, drive_url, uploads)
+    for local_path, error in upload_errors.items():
+        if error is None:
+            logging.info(f"Uploaded to OneDrive → {_source_name(local_path)}")
+        else:
+            logging.error(f" Upload failed for {_source_name(local_path)}: {error}")
+
+    errors = {}
+    for item, outputs in results:
+        failed = [path for path in outputs if upload_errors.get(path) is not None]
+        if failed:
+            errors[item["id"]] = upload_errors[failed[0]]
+        elif on_uploaded is not None:
+            on_uploaded(item)
+    to_move = [item["id"] for item, _ in results if item["id"] not in errors]
+    if to_move:
+        errors.update(move_files_to_folder(headers, drive_id, to_move, processed_folder))
+    return errors
@@ -1,23 +1,77 @@
 # pdf_classifier.py
-import pdfplumber
-import fitz
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
 
-def classify_pdf(file_path, max_pages=3):
-    try:
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages[:max_pages]:
-                tables = page.extract_tables()
-                if tables and any(any(row) for table in tables for row in table):
-                    return 'table'
-
-        doc = fitz.open(file_path)
-        for page in doc[:max_pages]:
-            text = page.get_text().strip()
-            if len(text) > 100:
-                return 'text'
+import config
+from pdf_document import as_document
 
-        return 'unknown'
+# Phrase each bureau prints on the first page of its report, per report type (the handler names in report_handlers)
+DEFAULT_KEYWORDS = {
+    "table": ["Borrower Profile"],
+    "text": ["CONSUMER CIR"],
+}
+
+Classification = namedtuple("Classification", "label confidence pages_read cached")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def fingerprint(doc):
+    """Cheap identity of a PDF: producer metadata, page count and a hash of the first page's raw content stream."""
+    meta = doc.fitz.metadata or {}
+    h = hashlib.sha1()
+    for field in ("producer", "creator", "creationDate", "modDate"):
+        h.update((meta.get(field) or "").encode("utf-8", "replace") + b"\0")
+    h.update(str(doc.page_count).encode("ascii") + b"\0")
+    if doc.page_count:
+        h.update(doc.fitz[0].read_contents())
+    return h.hexdigest()
+
+
+def _score(content, keywords):
+    return {label: sum(1 for kw in kws if kw in content) for label, kws in keywords.items()}
 
+
+def classify(file_path, keywords=None, max_pages=3):
+    """Classify a PDF by keyword, stopping at the first page where exactly one report type matches."""
+    keywords = {label: tuple(kw.lower() for kw in kws) for label, kws in (keywords or DEFAULT_KEYWORDS).items()}
+    with as_document(file_path) as doc:
+        key = (fingerprint(doc), tuple(sorted(keywords.items())), max_pages)
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]._replace(cached=True)
+
+        totals = dict.fromkeys(keywords, 0)
+        pages_read = 0
+        for i in range(min(max_pages, doc.page_count)):
+            pages_read += 1
+            for label, hits in _score(doc.text(i).lower(), keywords).items():
+                totals[label] += hits
+            matched = [label for label, hits in totals.items() if hits]
+            if len(matched) == 1:
+                break
+
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+    best_label, best = ranked[0] if ranked else ("unknown", 0)
+    second = ranked[1][1] if len(ranked) > 1 else 0
+    if best == 0 or best == second:
+        result = Classification("unknown", 0.0 if best == 0 else 0.5, pages_read, False)
+    else:
+        result = Classification(best_label, best / (best + second), pages_read, False)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > config.CLASSIFIER_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def classify_pdf(file_path, max_pages=3):
+    try:
+        return classify(file_path, max_pages=max_pages).label
     except Exception as e:
         print(f"[Classifier] Error: {e}")
         return 'unknown'
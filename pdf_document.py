@@ -0,0 +1,133 @@
+import io
+import os
+import hashlib
+import contextlib
+
+# Version of what text() and tables() return, for page artifacts kept in the artifact cache
+PAGE_CACHE_VERSION = 1
+
+
+class PdfDocument:
+    """One PDF shared by classification and extraction; pages are read once and numbered from 0.
+
+    source is a path, the PDF's bytes or a binary file object (such as report_handlers.MemoryFile).
+    """
+
+    def __init__(self, source, name=None):
+        self.source = source
+        if name is None:
+            name = os.path.basename(source) if isinstance(source, str) else getattr(source, "name", "document.pdf")
+        self.name = name
+        self._data = None
+        self._sha256 = None
+        self._page_count = None
+        self._fitz = None
+        self._plumber = None
+        self._text = {}
+        self._words = {}
+        self._tables = {}
+
+    def _bytes(self):
+        if self._data is None:
+            if isinstance(self.source, (bytes, bytearray)):
+                self._data = bytes(self.source)
+            else:
+                self.source.seek(0)
+                self._data = self.source.read()
+        return self._data
+
+    @property
+    def fitz(self):
+        if self._fitz is None:
+            import fitz
+            if isinstance(self.source, str):
+                self._fitz = fitz.open(self.source)
+            else:
+                self._fitz = fitz.open(stream=self._bytes(), filetype="pdf")
+        return self._fitz
+
+    @property
+    def plumber(self):
+        if self._plumber is None:
+            import pdfplumber
+            self._plumber = pdfplumber.open(self.source if isinstance(self.source, str) else io.BytesIO(self._bytes()))
+        return self._plumber
+
+    @property
+    def sha256(self):
+        """Hex sha256 of the PDF's bytes, the key its artifacts are cached under (see artifact_cache)."""
+        if self._sha256 is None:
+            if isinstance(self.source, str):
+                from artifact_cache import file_sha256
+                self._sha256 = file_sha256(self.source)
+            else:
+                self._sha256 = hashlib.sha256(self._bytes()).hexdigest()
+        return self._sha256
+
+    @property
+    def page_count(self):
+        if self._page_count is None:
+            self._page_count = self.fitz.page_count
+        return self._page_count
+
+    def text(self, i):
+        """PyMuPDF plain text of page i."""
+        if i not in self._text:
+            self._text[i] = self.fitz[i].get_text("text") or ""
+        return self._text[i]
+
+    def iter_text(self):
+        """PyMuPDF plain text of each page in turn, without keeping it; pages already read by text() are reused."""
+        for i in range(self.page_count):
+            text = self._text.get(i)
+            yield text if text is not None else (self.fitz[i].get_text("text") or "")
+
+    def words(self, i):
+        """pdfplumber words (with positions) of page i."""
+        if i not in self._words:
+            self._words[i] = self.plumber.pages[i].extract_words()
+        return self._words[i]
+
+    def tables(self, i):
+        """pdfplumber tables of page i, as lists of rows."""
+        if i not in self._tables:
+            self._tables[i] = self.plumber.pages[i].extract_tables()
+        return self._tables[i]
+
+    def pages(self, kind):
+        """Every page's "text" or "tables" as a list, or None unless all of them have been read."""
+        cached = {"text": self._text, "tables": self._tables}[kind]
+        if len(cached) < self.page_count:
+            return None
+        return [cached[i] for i in range(self.page_count)]
+
+    def preload(self, kind, pages):
+        """Take every page's "text" or "tables" from an earlier pages() call instead of parsing the PDF."""
+        cached = {"text": self._text, "tables": self._tables}[kind]
+        cached.update(enumerate(pages))
+        if self._page_count is None:
+            self._page_count = len(pages)
+
+    def close(self):
+        if self._fitz is not None:
+            self._fitz.close()
+            self._fitz = None
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+@contextlib.contextmanager
+def as_document(source):
+    """Use source if it is already a PdfDocument (leaving it open), otherwise open one for the block."""
+    if isinstance(source, PdfDocument):
+        yield source
+    else:
+        with PdfDocument(source) as doc:
+            yield doc
@@ -0,0 +1,187 @@
+import time
+import queue
+import logging
+import threading
+
+import config
+
+
+class PipelineJob:
+    """One PDF moving through the pipeline; item is the OneDrive listing entry, or None for local files.
+
+    A job that already has a result skips the process stage. data, when download() sets it, is
+    passed to process() instead of the path.
+    """
+
+    def __init__(self, key, path, item=None, args=(), result=None, state=None):
+        self.key = key
+        self.path = path
+        self.item = item
+        self.args = tuple(args)
+        self.result = result
+        self.state = state
+        self.data = None
+        self.error = None
+        self.failed_stage = None
+
+    @property
+    def name(self):
+        return self.item["name"] if self.item else self.path
+
+
+class Pipeline:
+    """Download → process → publish stages joined by bounded queues, so transfers overlap extraction.
+
+    process(path) runs in the worker pool, the other stages on threads here. Finished jobs are
+    collected from completed(); checkpoint(job, stage), if given, is called after each stage.
+    """
+
+    def __init__(self, pool, download, process, publish, prefetch=None, download_threads=None,
+                 publish_batch=None, publish_linger=None, checkpoint=None):
+        self.pool = pool
+        self.download = download
+        self.process = process
+        self.publish = publish
+        self.checkpoint = checkpoint
+        self.publish_batch = publish_batch or config.PIPELINE_PUBLISH_BATCH
+        self.publish_linger = config.PIPELINE_PUBLISH_LINGER if publish_linger is None else publish_linger
+
+        self._incoming = queue.Queue()
+        self._ready = queue.Queue(maxsize=prefetch or config.PIPELINE_PREFETCH)
+        self._processed = queue.Queue(maxsize=self.publish_batch)
+        self._completed = queue.Queue()
+        self._active = set()
+        self._closing = threading.Event()
+
+        stages = [(f"download-{i}", self._download_loop) for i in range(download_threads or config.PIPELINE_DOWNLOAD_THREADS)]
+        # One dispatcher per worker process keeps every worker busy without queueing work inside the pool
+        stages += [(f"process-{i}", self._process_loop) for i in range(pool.workers)]
+        stages += [("publish", self._publish_loop)]
+        self._threads = [threading.Thread(target=fn, name=f"pipeline-{name}", daemon=True) for name, fn in stages]
+        for thread in self._threads:
+            thread.start()
+
+    # --- caller side ---
+    def submit(self, job):
+        """Queue a job unless one with the same key is still in flight; returns whether it was queued."""
+        if job.key in self._active:
+            return False
+        self._active.add(job.key)
+        self._incoming.put(job)
+        return True
+
+    def completed(self):
+        """Yield the jobs that have left the pipeline since the last call."""
+        while True:
+            try:
+                job = self._completed.get_nowait()
+            except queue.Empty:
+                return
+            self._active.discard(job.key)
+            yield job
+
+    def __contains__(self, key):
+        return key in self._active
+
+    def __len__(self):
+        return len(self._active)
+
+    @property
+    def busy(self):
+        return bool(self._active)
+
+    def close(self, timeout=5):
+        # Jobs still in flight are dropped; their files stay in the input folders and are picked up on the next start
+        self._closing.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- stages ---
+    def _get(self, q):
+        while not self._closing.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+
+    def _put(self, q, job):
+        while not self._closing.is_set():
+            try:
+                q.put(job, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _passed(self, job, stage):
+        if self.checkpoint is not None:
+            try:
+                self.checkpoint(job, stage)
+            except Exception as e:
+                logging.warning(f" Could not record {stage} for {job.name}: {e}")
+
+    def _fail(self, job, stage, error):
+        logging.error(f" {stage.capitalize()} failed for {job.name}: {error}")
+        job.error, job.failed_stage = error, stage
+        self._completed.put(job)
+
+    def _download_loop(self):
+        while True:
+            job = self._get(self._incoming)
+            if job is None:
+                return
+            try:
+                self.download(job)
+            except Exception as e:
+                self._fail(job, "download", e)
+                continue
+            self._passed(job, "download")
+            self._put(self._ready, job)
+
+    def _process_loop(self):
+        while True:
+            job = self._get(self._ready)
+            if job is None:
+                return
+            if job.result is None:
+                try:
+                    source = job.path if job.data is None else job.data
+                    job.result = self.pool.submit(self.process, source, *job.args).result()
+                except Exception as e:
+                    self._fail(job, "process", e)
+                    continue
+                finally:
+                    job.data = None
+                self._passed(job, "process")
+            self._put(self._processed, job)
+
+    def _publish_loop(self):
+        while True:
+            job = self._get(self._processed)
+            if job is None:
+                return
+            # Give other files a moment to finish so they are published in the same batch
+            batch = [job]
+            deadline = time.monotonic() + self.publish_linger
+            while len(batch) < self.publish_batch:
+                try:
+                    batch.append(self._processed.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                errors = self.publish(batch)
+            except Exception as e:
+                errors = {job.key: e for job in batch}
+            for job in batch:
+                if errors.get(job.key):
+                    self._fail(job, "publish", errors[job.key])
+                else:
+                    self._passed(job, "publish")
+                    self._completed.put(job)
@@ -0,0 +1,284 @@
+import io
+import os
+import csv
+import json
+import logging
+import importlib
+import contextlib
+
+import config
+import artifact_cache
+from pdf_document import PdfDocument, as_document, PAGE_CACHE_VERSION
+
+# The PDF and spreadsheet libraries (pdfplumber, fitz, pandas, ezodf) are imported inside the
+# handlers: only worker processes need them, so the monitor itself starts and polls without them
+
+# Most pages read when classifying; every bureau prints its report title on the first page or two,
+# and reading stops at the first page that matches a single report type
+CLASSIFY_PAGES = 2
+
+
+class MemoryFile(io.BytesIO):
+    """A PDF or output file kept in memory instead of on disk; name is its file name."""
+
+    def __init__(self, name, data=b""):
+        super().__init__(data)
+        self.name = name
+
+
+def source_name(source):
+    """File name of a path, a MemoryFile or a PdfDocument."""
+    return source.name if isinstance(source, (MemoryFile, PdfDocument)) else os.path.basename(source)
+
+
+class ReportHandler:
+    """A report type the monitor can process: the phrases that identify it and how to turn it into output files.
+
+    stages names the modules that produce its outputs; their STAGE_VERSIONs make up the version its
+    outputs are cached under, so raising any of them sends the report through the handler again.
+    """
+
+    def __init__(self, name, keywords, process, stages=()):
+        self.name = name
+        self.keywords = [kw.lower() for kw in keywords]
+        self.process = process
+        self.stages = tuple(stages)
+
+    @property
+    def version(self):
+        return ".".join(str(importlib.import_module(stage).STAGE_VERSION) for stage in self.stages)
+
+
+# Registered report types, in the order they were added
+HANDLERS = {}
+
+
+def register_handler(name, keywords, stages=()):
+    """Register process(doc, output_dir) -> [output paths] as the handler for reports containing keywords.
+
+    doc is the job's PdfDocument, already used to classify the report. With output_dir None the
+    handler returns its outputs as MemoryFiles instead of writing files.
+    """
+    def decorator(process):
+        HANDLERS[name] = ReportHandler(name, keywords, process, stages)
+        return process
+    return decorator
+
+
+def classify_pdf(file_path):
+    """Name of the handler whose keywords best match the first pages, or "unknown" when none (or a tie) does.
+
+    Pass the job's PdfDocument so the page text read here is reused by the extractor.
+    """
+    import pdf_classifier
+
+    keywords = {name: handler.keywords for name, handler in HANDLERS.items()}
+    # Any change to the handlers' keywords is a new classifier version
+    version = f"{CLASSIFY_PAGES}:{sorted(keywords.items())}"
+    try:
+        with as_document(file_path) as doc:
+            cache = artifact_cache.get_cache()
+            label = cache.get(doc.sha256, "classified", version) if cache else None
+            if label is not None:
+                logging.info(f"Classified {doc.name} as {label} (from the artifact cache)")
+                return label
+            result = pdf_classifier.classify(doc, keywords, max_pages=CLASSIFY_PAGES)
+            if cache and result.label != "unknown":
+                cache.put(doc.sha256, "classified", version, result.label)
+    except Exception as e:
+        logging.error(f"Failed to classify PDF {source_name(file_path)}: {e}")
+        return "unknown"
+    logging.info(f"Classified {source_name(file_path)} as {result.label} ({result.confidence:.0%} confidence, "
+                 f"{result.pages_read} page(s) read{', cached' if result.cached else ''})")
+    return result.label
+
+
+def process_report(file_path, output_dir, report_type=None):
+    """Classify file_path unless report_type is given and run its handler; returns (report_type, outputs).
+
+    file_path may be a path, a MemoryFile or a PdfDocument; the PDF is parsed once for both steps.
+    Raises when no handler matches or the handler produced nothing, so the file is not moved to Processed.
+    With output_dir None the outputs are MemoryFiles (see register_handler). A PDF the current handler
+    code has already processed gets its outputs back from the artifact cache without being parsed.
+    """
+    with as_document(file_path) as doc:
+        if report_type is None:
+            report_type = classify_pdf(doc)
+        handler = HANDLERS.get(report_type)
+        if handler is None:
+            raise ValueError(f"No report handler for {doc.name} (classified as {report_type})")
+        stage = f"{report_type}.outputs"
+        outputs = load_outputs(doc, stage, handler.version, output_dir)
+        if outputs is None:
+            outputs = handler.process(doc, output_dir)
+            store_outputs(doc, stage, handler.version, outputs)
+    if not outputs:
+        raise ValueError(f"The {report_type} handler produced no output for {doc.name}")
+    return report_type, outputs
+
+
+def read_outputs(outputs):
+    """Rows of each output spreadsheet as a list of dicts, keyed by file name (empty cells become None)."""
+    import pandas as pd
+
+    records = {}
+    for path in outputs:
+        if isinstance(path, MemoryFile):
+            path.seek(0)
+        df = pd.read_excel(path, engine="openpyxl")
+        records[source_name(path)] = json.loads(df.to_json(orient="records", date_format="iso"))
+    return records
+
+
+def extract_report(file_path, output_dir):
+    """process_report() plus the rows it produced, for callers that want the data rather than the files."""
+    report_type, outputs = process_report(file_path, output_dir)
+    return report_type, outputs, read_outputs(outputs)
+
+
+# === Artifact cache ===
+# Each stage's result is kept under the PDF's sha256 and the stage's version (see artifact_cache)
+@contextlib.contextmanager
+def cached_pages(doc, kind):
+    """Serve doc's page "text" or "tables" from the artifact cache, storing them once read if they were not there."""
+    cache = artifact_cache.get_cache()
+    stage = f"pages.{kind}"
+    pages = cache.get(doc.sha256, stage, PAGE_CACHE_VERSION) if cache else None
+    if pages is not None:
+        doc.preload(kind, pages)
+    yield
+    if cache and pages is None:
+        pages = doc.pages(kind)
+        if pages is not None:
+            cache.put(doc.sha256, stage, PAGE_CACHE_VERSION, pages)
+
+
+def cached_stage(doc, stage, version, compute):
+    """compute()'s result for doc, from the artifact cache when this version of stage already ran on it."""
+    cache = artifact_cache.get_cache()
+    if cache is None:
+        return compute()
+    value = cache.get(doc.sha256, stage, version)
+    if value is not None:
+        logging.info(f"Reusing cached {stage} of {doc.name}")
+        return value
+    value = compute()
+    if value is not None:
+        cache.put(doc.sha256, stage, version, value)
+    return value
+
+
+def load_outputs(doc, stage, version, output_dir):
+    """Outputs stored by store_outputs(), written to output_dir (or as MemoryFiles) under doc's name; None if absent."""
+    cache = artifact_cache.get_cache()
+    stored = cache.get(doc.sha256, stage, version) if cache else None
+    if stored is None:
+        return None
+    logging.info(f"Reusing cached outputs of {doc.name}")
+    base_name = os.path.splitext(doc.name)[0]
+    outputs = []
+    for suffix, data in stored:
+        if output_dir is None:
+            outputs.append(MemoryFile(base_name + suffix, data))
+            continue
+        path = os.path.join(output_dir, base_name + suffix)
+        with open(path, "wb") as f:
+            f.write(data)
+        outputs.append(path)
+    return outputs
+
+
+def store_outputs(doc, stage, version, outputs):
+    cache = artifact_cache.get_cache()
+    if cache is None or not outputs:
+        return
+    # Stored by what follows the PDF's base name, so the same report sent under another name gets its own names
+    base_name = os.path.splitext(doc.name)[0]
+    stored = []
+    for output in outputs:
+        name = source_name(output)
+        if not name.startswith(base_name):
+            return
+        if isinstance(output, MemoryFile):
+            data = output.getvalue()
+        else:
+            with open(output, "rb") as f:
+                data = f.read()
+        stored.append((name[len(base_name):], data))
+    cache.put(doc.sha256, stage, version, stored)
+
+
+def intermediates_dir(output_dir):
+    """Folder for a report's intermediate files, or None unless config.DEBUG_INTERMEDIATES asks for them."""
+    if not config.DEBUG_INTERMEDIATES or output_dir is None:
+        return None
+    os.makedirs(config.DEBUG_INTERMEDIATES_DIR, exist_ok=True)
+    return config.DEBUG_INTERMEDIATES_DIR
+
+
+# === Commercial bureau reports (tables) ===
+@register_handler("table", ["Borrower Profile"], stages=("cibil_pdf_extract", "cibil_file_import"))
+def process_commercial_report(doc, output_dir):
+    import cibil_pdf_extract
+    from cibil_file_import import extract_data_from_records, append_data_to_ods
+
+    def extract():
+        with cached_pages(doc, "tables"):
+            return cibil_pdf_extract.extract_table_rows(doc)
+
+    records = cached_stage(doc, "table.records", cibil_pdf_extract.STAGE_VERSION, extract)
+    logging.info(f"Extracted {len(records)} table rows from {doc.name}")
+    base_name = os.path.splitext(doc.name)[0]
+    debug_dir = intermediates_dir(output_dir)
+    if debug_dir:
+        csv_output = os.path.join(debug_dir, base_name + ".csv")
+        with open(csv_output, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(record.cells for record in records)
+        logging.info(f"Wrote intermediate table CSV: {csv_output}")
+
+    output = MemoryFile(base_name + ".xlsx") if output_dir is None else os.path.join(output_dir, base_name + ".xlsx")
+    extracted_data, max_len = extract_data_from_records(records)
+    append_data_to_ods(extracted_data, max_len, output)
+    return [output]
+
+
+# === Consumer bureau reports (text) ===
+@register_handler("text", ["CONSUMER CIR"], stages=("text_extract", "text_import"))
+def process_consumer_report(doc, output_dir):
+    import text_extract
+    import text_import
+
+    base_name = os.path.splitext(doc.name)[0]
+    debug_dir = intermediates_dir(output_dir)
+    cache = artifact_cache.get_cache()
+    records = cache.get(doc.sha256, "text.records", text_extract.STAGE_VERSION) if cache else None
+    kept = None
+    if records is not None:
+        logging.info(f"Reusing cached text.records of {doc.name}")
+    else:
+        # Rows go from the extractor to the import one account at a time; page text is not kept.
+        # Only the rows themselves are collected on the way, when the cache or debugging wants them
+        kept = [] if cache or debug_dir else None
+
+        def stream():
+            for row in text_extract.iter_records(doc):
+                if kept is not None:
+                    kept.append(row)
+                yield row
+
+        records = stream()
+
+    if output_dir is None:
+        output = MemoryFile(f"{base_name}_extract_output.xlsx")
+    else:
+        output = os.path.join(output_dir, f"{base_name}_extract_output.xlsx")
+    processed = text_import.import_records(records, output)
+    if kept is not None:
+        logging.info(f"Extracted {len(kept)} text rows from {doc.name}")
+        if cache:
+            cache.put(doc.sha256, "text.records", text_extract.STAGE_VERSION, kept)
+    if debug_dir:
+        text_extract.save_records(kept if kept is not None else records, os.path.join(debug_dir, f"{base_name}_extract.ods"),
+                                  output_format="ods")
+    logging.info(f"Processed text file: {source_name(processed)}")
+    return [processed]
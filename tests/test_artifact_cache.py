@@ -0,0 +1,55 @@
+import itertools
+
+import pytest
+
+import artifact_cache
+from artifact_cache import ArtifactCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A clock that always moves forward, so every use has its own last_used
+    clock = itertools.count(1000)
+    monkeypatch.setattr(artifact_cache.time, "time", lambda: next(clock))
+    cache = ArtifactCache(str(tmp_path), max_bytes=0)
+    yield cache
+    cache.close()
+
+
+def entry_size(cache, value):
+    cache.put("size", "probe", 1, value)
+    size = cache._conn.execute("SELECT size FROM artifacts").fetchone()[0]
+    cache._remove(cache._key("size", "probe", 1))
+    return size
+
+
+def test_round_trip_and_versions(cache):
+    cache.put("d", "pages.text", 1, ["page one"])
+    assert cache.get("d", "pages.text", 1) == ["page one"]
+    assert cache.get("d", "pages.text", 2) is None
+    assert cache.get("other", "pages.text", 1, default=[]) == []
+
+
+def test_evicts_least_recently_used(cache):
+    value = b"x" * 1000
+    cache.max_bytes = entry_size(cache, value) * 3
+    for digest in "abc":
+        cache.put(digest, "stage", 1, value)
+    assert cache.get("a", "stage", 1) == value  # a is now the most recently used
+    cache.put("d", "stage", 1, value)
+    assert cache.get("b", "stage", 1) is None
+    assert all(cache.get(digest, "stage", 1) == value for digest in "acd")
+
+
+def test_skips_values_larger_than_the_cache(cache):
+    cache.max_bytes = 100
+    cache.put("d", "stage", 1, b"x" * 1000)
+    assert cache.get("d", "stage", 1) is None
+
+
+def test_unreadable_entry_is_dropped(cache):
+    cache.put("d", "stage", 1, "value")
+    with open(cache._path(cache._key("d", "stage", 1)), "wb") as f:
+        f.write(b"not a pickle")
+    assert cache.get("d", "stage", 1, default="gone") == "gone"
+    assert cache._conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0] == 0
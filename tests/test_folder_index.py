@@ -0,0 +1,25 @@
+from folder_watcher import FolderIndex
+
+
+def make_index(tmp_path, names):
+    for name in names:
+        (tmp_path / name).write_bytes(b"%PDF")
+    return FolderIndex(str(tmp_path), mode="poll")
+
+
+def test_page_sorts_case_insensitively_and_skips_other_files(tmp_path):
+    index = make_index(tmp_path, ["b.pdf", "A.PDF", "c.pdf", "notes.txt"])
+    assert index.page() == (["A.PDF", "b.pdf", "c.pdf"], 3)
+
+
+def test_page_prefix_any_case(tmp_path):
+    index = make_index(tmp_path, ["Report1.pdf", "report2.pdf", "REPORT3.pdf", "summary.pdf"])
+    assert index.page("rEpOrT") == (["Report1.pdf", "report2.pdf", "REPORT3.pdf"], 3)
+    assert index.page("x") == ([], 0)
+
+
+def test_page_offset_and_limit(tmp_path):
+    index = make_index(tmp_path, [f"r{i:02}.pdf" for i in range(10)] + ["s.pdf"])
+    assert index.page("r", offset=3, limit=4) == (["r03.pdf", "r04.pdf", "r05.pdf", "r06.pdf"], 10)
+    assert index.page("r", offset=8, limit=4) == (["r08.pdf", "r09.pdf"], 10)
+    assert index.page("r", offset=20) == ([], 10)
@@ -0,0 +1,53 @@
+import pytest
+
+from job_journal import JobJournal, state_reached
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = JobJournal(str(tmp_path / "jobs.db"))
+    yield journal
+    journal.close()
+
+
+def test_state_reached():
+    assert not state_reached(None, "discovered")
+    entry = {"state": "extracted", "last_ok_state": "extracted"}
+    assert state_reached(entry, "classified")
+    assert state_reached(entry, "extracted")
+    assert not state_reached(entry, "uploaded")
+
+
+def test_state_reached_counts_a_failed_job_up_to_its_last_good_stage():
+    entry = {"state": "failed", "last_ok_state": "downloaded"}
+    assert state_reached(entry, "downloaded")
+    assert not state_reached(entry, "classified")
+    assert not state_reached({"state": "failed", "last_ok_state": None}, "discovered")
+
+
+def test_record_keeps_fields_left_out(journal):
+    journal.record("k", "discovered", item_id="i", name="a.pdf")
+    journal.record("k", "classified", pdf_type="text")
+    journal.record("k", "extracted", outputs=["a.ods"])
+    entry = journal.get("k")
+    assert (entry["item_id"], entry["name"], entry["pdf_type"], entry["outputs"]) == ("i", "a.pdf", "text", ["a.ods"])
+    assert entry["state"] == "extracted"
+    assert journal.get("missing") is None
+
+
+def test_fail_counts_attempts_and_keeps_the_last_good_stage(journal):
+    journal.record("k", "downloaded")
+    assert journal.fail("k", "boom") == 1
+    assert journal.fail("k", "boom again") == 2
+    entry = journal.get("k")
+    assert (entry["state"], entry["last_ok_state"], entry["error"]) == ("failed", "downloaded", "boom again")
+    assert state_reached(entry, "downloaded")
+
+
+def test_discovered_again_clears_attempts(journal):
+    journal.fail("k", "boom")
+    journal.record("k", "classified")
+    assert journal.get("k")["attempts"] == 1
+    journal.record("k", "discovered")
+    entry = journal.get("k")
+    assert (entry["attempts"], entry["error"]) == (0, None)
@@ -0,0 +1,39 @@
+import os
+import base64
+
+from onedrive_utils import QuickXorHash
+
+
+def reference_digest(data):
+    # Byte by byte, as in Microsoft's description of the algorithm
+    register = 0
+    for i, byte in enumerate(data):
+        shift = (i * 11) % 160
+        shifted = byte << shift
+        register ^= (shifted & ((1 << 160) - 1)) | (shifted >> 160)
+    out = bytearray(register.to_bytes(20, "little"))
+    for i, b in enumerate(len(data).to_bytes(8, "little")):
+        out[12 + i] ^= b
+    return bytes(out)
+
+
+def test_empty():
+    assert QuickXorHash().b64digest() == base64.b64encode(bytes(20)).decode("ascii")
+
+
+def test_matches_reference():
+    for size in (1, 159, 160, 161, 1000, 4096 + 7):
+        data = os.urandom(size)
+        h = QuickXorHash()
+        h.update(data)
+        assert h.digest() == reference_digest(data), size
+
+
+def test_chunked_updates_match_one_update():
+    data = os.urandom(5000)
+    whole = QuickXorHash()
+    whole.update(data)
+    pieces = QuickXorHash()
+    for start, end in [(0, 1), (1, 159), (159, 321), (321, 4000), (4000, 5000)]:
+        pieces.update(data[start:end])
+    assert pieces.digest() == whole.digest()
@@ -0,0 +1,32 @@
+from text_extract import PrefixTrie, HeaderFooterFilter, LINE_TRIE, PLAIN_LINE
+
+
+def test_trie_keeps_the_longest_matching_rule():
+    trie = PrefixTrie([("PAGE", "skip", True), ("PAGE 1", "field", "First")])
+    assert trie.classify("PAGE 2 OF 3") == PLAIN_LINE._replace(skip=True)
+    assert trie.classify("PAGE 1 OF 3") == PLAIN_LINE._replace(skip=True, field="First")
+    assert trie.classify("PAG") == PLAIN_LINE
+    assert trie.classify("") == PLAIN_LINE
+
+
+def test_line_rules():
+    assert LINE_TRIE.classify("TYPE: CREDIT CARD").field == "Type"
+    assert LINE_TRIE.classify("TYPE: CREDIT CARD").next_field
+    assert LINE_TRIE.classify("CURRENT BALANCE: 1,000").field == "Current Balance"
+    assert LINE_TRIE.classify("MEMBER ID: X").skip
+    assert LINE_TRIE.classify("SOMETHING ELSE") == PLAIN_LINE
+
+
+def test_filter_cleans_like_clean_line_and_drops_empty_lines():
+    furniture = HeaderFooterFilter()
+    assert list(furniture.clean_page("  ACCOUNT  A  \n\nPAGE 1 OF 2\nTransUnion CIBIL x")) == ["ACCOUNT A", "x"]
+
+
+def test_filter_learns_lines_repeated_at_the_same_place():
+    furniture = HeaderFooterFilter(depth=2)
+    header = "CONSUMER CIR  REPORT"
+    pages = [f"{header}\nbody {i}\nmore {i}\nPAGE {i} OF 3" for i in range(1, 4)]
+    out = [list(furniture.clean_page(text)) for text in pages]
+    assert out[2] == ["CONSUMER CIR REPORT", "body 3", "more 3"]
+    # The header repeated on the same line of consecutive pages; the page numbers and body did not
+    assert furniture.known == {header: "CONSUMER CIR REPORT"}
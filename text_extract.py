@@ -1,17 +1,155 @@
-import fitz  # PyMuPDF
 import pandas as pd
 import re
 import os
 import glob
-
-def extract_pdf_folder(folder_path, output_folder=None, output_format='ods'):
-   
-    ext_map = {
-        'ods': 'ods',
-        'xlsx': 'xlsx',
-        'txt': 'txt'
-    }
-
+from collections import deque, namedtuple
+from itertools import islice
+from pdf_document import as_document
+
+ext_map = {
+    'ods': 'ods',
+    'xlsx': 'xlsx',
+    'txt': 'txt'
+}
+
+footer_patterns = [
+    r"©.*TransUnion CIBIL.*", r"Formerly: Credit Information Bureau.*",
+    r"all rights reserved\.?", r"CIN\s*:\s*[A-Z0-9\-]+",
+    r"MEMBER\s+ID\s*:\s*.*", r"CONTROL\s+NUMBER\s*:\s*.*",
+    r"DATE\s*:\s*\d{2}-\d{2}-\d{4}", r"PAGE\s*\d+\s*OF\s*\d+.*"
+]
+compiled_footers = [re.compile(p, re.IGNORECASE) for p in footer_patterns]
+# One search telling whether any footer pattern occurs in a line; most lines skip the substitutions
+any_footer = re.compile("|".join(f"(?:{p})" for p in footer_patterns), re.IGNORECASE)
+footer_fragments = ["TransUnion CIBIL"]
+multi_space = re.compile(r'\s{2,}')
+
+pan_regex = re.compile(r'\b([A-Z]{5}[0-9]{4}[A-Z])\b')
+name_keywords = ['CONSUMER NAME', 'NAME']
+ordered_fields = ['Type', 'Ownership', 'Sanctioned', 'Current Balance', 'DPD']
+dpd_header = "DAYS PAST DUE/ASSET CLASSIFICATION (UP TO 36 MONTHS; LEFT TO RIGHT)"
+# Furthest any rule looks past the current line (the DPD value can be up to 5 lines below its header)
+LOOKAHEAD = 5
+score_digits = re.compile(r'\d{3}')
+dpd_value = re.compile(r'[A-Z0-9\s]+')
+
+# === Account line rules ===
+# What an upper-cased line starts with and what that makes it, as (prefix, attribute, value):
+#   field       the line sets this account field, its value following the colon
+#   next_field  a look-ahead line belonging to the next field (ends a Type continuation or the DPD search)
+#   skip        a page header/footer line the DPD value search steps over
+# Compiled into LINE_TRIE; the DPD header can sit anywhere in a line and is matched separately.
+LINE_RULES = [
+    ("TYPE:", "field", "Type"),
+    ("OWNERSHIP:", "field", "Ownership"),
+    ("SANCTIONED:", "field", "Sanctioned"),
+    ("HIGH CREDIT:", "field", "High Credit"),
+    ("CURRENT BALANCE:", "field", "Current Balance"),
+    *[(fld.upper(), "next_field", True) for fld in ordered_fields],
+    *[(bad, "skip", True) for bad in ["CONSUMER CIR", "DATE:", "PAGE", "CONTROL NUMBER", "MEMBER ID"]],
+]
+
+LineKind = namedtuple("LineKind", "field next_field skip")
+PLAIN_LINE = LineKind(None, False, False)
+# A cleaned line of the report with its page, upper-cased text and LineKind
+Line = namedtuple("Line", "page text upper kind")
+
+
+class PrefixTrie:
+    """Character trie over rule prefixes; classify(text) gives the LineKind of every rule text starts with."""
+
+    def __init__(self, rules):
+        root = {}
+        for prefix, attr, value in rules:
+            node = root
+            for ch in prefix:
+                node = node.setdefault(ch, {})
+            node.setdefault(None, {})[attr] = value
+        self.root = self._compile(root, {})
+
+    def _compile(self, node, inherited):
+        # Every node carries the kind of the prefixes ending on the way to it, so a walk keeps the last one
+        attrs = {**inherited, **node.get(None, {})}
+        compiled = {ch: self._compile(child, attrs) for ch, child in node.items() if ch is not None}
+        compiled[None] = PLAIN_LINE._replace(**attrs)
+        return compiled
+
+    def classify(self, text):
+        node = self.root
+        for ch in text:
+            child = node.get(ch)
+            if child is None:
+                break
+            node = child
+        return node[None]
+
+
+LINE_TRIE = PrefixTrie(LINE_RULES)
+
+# Raise whenever a change here alters the extracted rows; cached extracts of older versions are then redone
+STAGE_VERSION = 2
+
+
+# Lines this far from the top or bottom of a page are checked for repeated headers and footers
+HEADER_FOOTER_DEPTH = 6
+# Most distinct header/footer lines remembered per report
+HEADER_FOOTER_MAX = 256
+
+
+def clean_line(line: str) -> str:
+    if any_footer.search(line):
+        for pat in compiled_footers:
+            line = pat.sub('', line)
+    for frag in footer_fragments:
+        line = line.replace(frag, '')
+    return multi_space.sub(' ', line).strip()
+
+
+class HeaderFooterFilter:
+    """Cleans a report's pages, learning the header and footer lines repeated on every page.
+
+    A line at the same distance from the top or bottom of its page as on the previous page is page
+    furniture: it is cleaned once and afterwards looked up by its text, so clean_line() only runs on
+    lines not seen before. Furniture that cleans to nothing (the CIBIL footer block) is dropped.
+    """
+
+    def __init__(self, depth=HEADER_FOOTER_DEPTH):
+        self.depth = depth
+        self.known = {}
+        self._previous = {}
+
+    def clean_page(self, text):
+        """Yield the cleaned, non-empty lines of one page's text."""
+        last = text.count('\n')
+        current = {}
+        start = 0
+        i = 0
+        while start <= len(text):
+            end = text.find('\n', start)
+            if end < 0:
+                end = len(text)
+            raw = text[start:end].strip()
+            start = end + 1
+            cl = self.known.get(raw)
+            if cl is None:
+                cl = clean_line(raw)
+                slot = i if i < self.depth else i - last - 1 if last - i < self.depth else None
+                if slot is not None:
+                    if self._previous.get(slot) == raw and len(self.known) < HEADER_FOOTER_MAX:
+                        self.known[raw] = cl
+                    current[slot] = raw
+            i += 1
+            if cl:
+                yield cl
+        self._previous = current
+
+
+def extract_pdf_folder(folder_path, output_folder=None, output_format='ods', skip_up_to_date=False, workers=None):
+    """Extract every PDF in folder_path, each one once, in parallel; returns the output files.
+
+    With skip_up_to_date, PDFs whose output is newer than the PDF are not extracted again.
+    workers=1 runs in this process; by default a WorkerPool is used when there is more than one PDF.
+    """
     pdf_files = glob.glob(os.path.join(folder_path, '*.pdf'))
     if not pdf_files:
         raise FileNotFoundError(f" No PDF files found in folder: {folder_path}")
@@ -21,128 +159,181 @@ def extract_pdf_folder(folder_path, output_folder=None, output_format='ods'):
         output_folder = folder_path
     os.makedirs(output_folder, exist_ok=True)
 
-    footer_patterns = [
-        r"©.*TransUnion CIBIL.*", r"Formerly: Credit Information Bureau.*",
-        r"all rights reserved\.?", r"CIN\s*:\s*[A-Z0-9\-]+",
-        r"MEMBER\s+ID\s*:\s*.*", r"CONTROL\s+NUMBER\s*:\s*.*",
-        r"DATE\s*:\s*\d{2}-\d{2}-\d{4}", r"PAGE\s*\d+\s*OF\s*\d+.*"
-    ]
-    compiled_footers = [re.compile(p, re.IGNORECASE) for p in footer_patterns]
-    footer_fragments = ["TransUnion CIBIL"]
-
-    def clean_line(line: str) -> str:
-        for pat in compiled_footers:
-            line = pat.sub('', line)
-        for frag in footer_fragments:
-            line = line.replace(frag, '')
-        return re.sub(r'\s{2,}', ' ', line).strip()
-
-    pan_regex = re.compile(r'\b([A-Z]{5}[0-9]{4}[A-Z])\b')
-    name_keywords = ['CONSUMER NAME', 'NAME']
-    ordered_fields = ['Type', 'Ownership', 'Sanctioned', 'Current Balance', 'DPD']
-    dpd_header = "DAYS PAST DUE/ASSET CLASSIFICATION (UP TO 36 MONTHS; LEFT TO RIGHT)"
-
-    extracted_files = []
-
+    jobs = []
     for pdf_path in pdf_files:
-        print(f"\nProcessing file: {pdf_path}")
         base_name = os.path.splitext(os.path.basename(pdf_path))[0]
         output_name = f"{base_name}_extract.{ext_map.get(output_format, 'ods')}"
         output_path = os.path.join(output_folder, output_name)
-
-        if not os.path.exists(pdf_path):
-            print(f"File not found: {pdf_path}")
+        if skip_up_to_date and os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(pdf_path):
+            print(f"Up to date, skipping: {pdf_path}")
             continue
+        jobs.append((pdf_path, output_path, output_format))
 
-        rows = []
+    # Either way a file that fails is reported and the rest of the folder carries on
+    pool = None
+    if workers == 1 or len(jobs) <= 1:
+        results = _extract_each(jobs)
+    else:
+        from worker_pool import WorkerPool
+        pool = WorkerPool(workers=workers, warm_imports=("fitz", "pandas", "text_extract"))
+        results = pool.map_unordered(extract_pdf_file, jobs)
 
-        with fitz.open(pdf_path) as doc:
-            all_lines = []
-            for pno, page in enumerate(doc, 1):
-                text = page.get_text("text") or ""
-                for ln in text.split('\n'):
-                    cl = clean_line(ln.strip())
-                    if cl:
-                        all_lines.append((pno, cl))
+    extracted_files = []
+    try:
+        for (pdf_path, output_path, _), saved, error in results:
+            if error is not None:
+                print(f" Failed to extract {pdf_path}: {error}")
+            elif saved:
+                extracted_files.append(output_path)
+    finally:
+        if pool is not None:
+            pool.close()
+    return extracted_files
 
-        pages_seen = {p for p, _ in all_lines}
 
-        pan = score = name = None
-        for i in range(len(all_lines)):
-            pno, line = all_lines[i]
-            upper = line.upper()
+def _extract_each(jobs):
+    """In-process counterpart of WorkerPool.map_unordered(extract_pdf_file, jobs)."""
+    for job in jobs:
+        try:
+            yield job, extract_pdf_file(*job), None
+        except Exception as e:
+            yield job, None, e
+
+
+def extract_pdf_file(pdf_path, output_path, output_format='ods'):
+    """Extract one report into output_path; returns whether it was saved.
+
+    pdf_path may also be the PDF's bytes, a binary file object or a PdfDocument (whose page text,
+    if already read to classify the report, is reused), and output_path a writable binary file
+    object (name it with the right extension), so nothing has to touch the disk.
+    """
+    return save_records(extract_pdf(pdf_path), output_path, output_format)
+
+
+def extract_pdf(pdf_path):
+    """Rows extracted from one report: dicts with Page, PAN, Name, Score, Field and Value.
+
+    pdf_path is a path, the PDF's bytes, a binary file object or a PdfDocument.
+    """
+    return list(iter_records(pdf_path))
+
+
+def iter_lines(doc):
+    """(page, line) for each non-empty cleaned line of doc, one page at a time.
+
+    Page text comes from PdfDocument.iter_text(), so pages are not kept once their lines are read.
+    Lines are sliced from the page text as they are reached instead of split into a list up front,
+    and repeated headers and footers are recognised rather than cleaned again (HeaderFooterFilter).
+    """
+    furniture = HeaderFooterFilter()
+    for pno, text in enumerate(doc.iter_text(), start=1):
+        for cl in furniture.clean_page(text):
+            yield pno, cl
+
+
+def classified_lines(doc):
+    """Line tuples for iter_lines(doc), each classified once so look-ahead checks reuse the result."""
+    for pno, text in iter_lines(doc):
+        upper = text.upper()
+        yield Line(pno, text, upper, LINE_TRIE.classify(upper))
+
+
+def with_lookahead(items, size=LOOKAHEAD):
+    """(item, ahead) for each item, where ahead holds up to the next `size` items (read it, do not change it)."""
+    items = iter(items)
+    ahead = deque(islice(items, size + 1))
+    while ahead:
+        current = ahead.popleft()
+        yield current, ahead
+        for item in islice(items, 1):
+            ahead.append(item)
+
+
+def iter_records(pdf_path):
+    """Rows of one report (see extract_pdf), yielded as each account closes.
+
+    The extractor itself holds the current page and a LOOKAHEAD-line window, not the whole document
+    (pages read earlier through PdfDocument.text(), such as the ones classified, stay on the document).
+    Every row carries the report's PAN, name and score, so accounts that close before all three have
+    been seen are held back until they are (or the document ends).
+    """
+    pan = score = name = None
+    pages_seen = set()
+    used_pages = set()
+    held = []
+    current_account = {}
+    current_page = None
+    last_field_page = None
+    gap_count = 0
+
+    def close_account():
+        if all(current_account.get(fld, 'No Data') == 'No Data' for fld in ordered_fields):
+            return
+        used_pages.add(current_page)
+        for fld in ordered_fields:
+            held.append((current_page, fld, current_account.get(fld, 'No Data')))
+
+    def release():
+        for page, fld, val in held:
+            yield {"Page": page, "PAN": pan, "Name": name, "Score": score, "Field": fld, "Value": val or 'No Data'}
+        held.clear()
+
+    with as_document(pdf_path) as doc:
+        for current, ahead in with_lookahead(classified_lines(doc)):
+            pno, line, upper, kind = current
+            pages_seen.add(pno)
+
+            if held and pan and score and name:
+                yield from release()
 
             if not pan and (m := pan_regex.search(line)):
                 pan = m.group(1)
             if not score and 'SCORE' in upper:
-                if m2 := re.search(r'\d{3}', line):
+                if m2 := score_digits.search(line):
                     score = m2.group()
-                elif i + 1 < len(all_lines) and re.match(r'^\d{3}$', all_lines[i + 1][1]):
-                    score = all_lines[i + 1][1]
+                elif ahead and score_digits.fullmatch(ahead[0].text):
+                    score = ahead[0].text
             if not name:
                 for nk in name_keywords:
                     if nk in upper:
                         parts = line.split(':', maxsplit=1)
-                        name = parts[1].strip() if len(parts) > 1 else (all_lines[i + 1][1] if i + 1 < len(all_lines) else "")
+                        name = parts[1].strip() if len(parts) > 1 else (ahead[0].text if ahead else "")
                         break
 
-        accounts = []
-        current_account = {}
-        current_page = None
-        last_field_page = None
-        gap_count = 0
-
-        for i in range(len(all_lines)):
-            pno, line = all_lines[i]
-            upper = line.upper()
-
-            field = None
+            field = kind.field
             value = None
 
-            if upper.startswith("TYPE:"):
-                field = "Type"
+            if field == "Type":
                 parts = line.split(":", 1)
                 value = parts[1].strip() if len(parts) > 1 else ""
-                if i + 1 < len(all_lines):
-                    next_line = all_lines[i + 1][1].strip()
-                    if next_line and not any(next_line.upper().startswith(x.upper()) for x in ordered_fields):
+                if ahead:
+                    next_line = ahead[0]
+                    if next_line.text and not next_line.kind.next_field:
                         if value:
-                            value = f"{value} {next_line}".strip()
+                            value = f"{value} {next_line.text}".strip()
                         else:
-                            value = next_line
-
-            elif upper.startswith("OWNERSHIP:"):
-                field = "Ownership"
-                value = line.split(":", 1)[1].strip()
-
-            elif upper.startswith("SANCTIONED:"):
-                field = "Sanctioned"
-                value = line.split(":", 1)[1].strip()
+                            value = next_line.text
 
-            elif upper.startswith("HIGH CREDIT:"):
+            elif field == "High Credit":
                 field = "Sanctioned"
                 if "Sanctioned" not in current_account or not current_account["Sanctioned"]:
                     value = line.split(":", 1)[1].strip()
                 else:
                     continue
 
-            elif upper.startswith("CURRENT BALANCE:"):
-                field = "Current Balance"
+            elif field:
                 value = line.split(":", 1)[1].strip()
 
             elif dpd_header in upper:
                 field = "DPD"
                 value = ""
-                for j in range(1, 6):
-                    if i + j >= len(all_lines):
+                for next_line in ahead:
+                    if next_line.kind.next_field:
                         break
-                    next_line = all_lines[i + j][1].strip().upper()
-                    if any(next_line.startswith(x.upper()) for x in ordered_fields):
-                        break
-                    if any(next_line.startswith(bad) for bad in ["CONSUMER CIR", "DATE:", "PAGE", "CONTROL NUMBER", "MEMBER ID"]):
+                    if next_line.kind.skip:
                         continue
-                    if re.fullmatch(r'[A-Z0-9\s]+', next_line):
-                        value = next_line
+                    if dpd_value.fullmatch(next_line.upper):
+                        value = next_line.upper
                         break
                 if not value:
                     value = line.strip()
@@ -158,46 +349,35 @@ def extract_pdf_folder(folder_path, output_folder=None, output_format='ods'):
                     gap_count += pno - (last_field_page or current_page)
                     last_field_page = pno
                 if gap_count > 2 or len(current_account) == len(ordered_fields):
-                    accounts.append((current_page, current_account.copy()))
+                    close_account()
                     current_account = {}
                     gap_count = 0
 
-        if current_account:
-            accounts.append((current_page, current_account.copy()))
-
-        for page, field_map in accounts:
-            if all(field_map.get(fld, 'No Data') == 'No Data' for fld in ordered_fields):
-                continue
-            meta = {"Page": page, "PAN": pan, "Name": name, "Score": score}
-            for fld in ordered_fields:
-                val = field_map.get(fld, 'No Data')
-                rows.append({**meta, "Field": fld, "Value": val})
-
-        used_pages = {r['Page'] for r in rows}
-        for p in sorted(pages_seen - used_pages):
-            rows.append({"Page": p, "PAN": pan, "Name": name, "Score": score, "Field": "No Data", "Value": "No Data"})
-
-        df = pd.DataFrame(rows, columns=["Page", "PAN", "Name", "Score", "Field", "Value"])
-        #df['Value'].replace('', 'No Data', inplace=True)
-        df.replace({'Value': {'': 'No Data'}}, inplace=True)
-        #df.method({col: value}, inplace=True)
-
-        
-
-        try:
-            if output_format == 'xlsx':
-                df.to_excel(output_path, index=False)
-            elif output_format == 'ods':
-                df.to_excel(output_path, engine='odf', index=False)
-            elif output_format == 'txt':
-                df.to_csv(output_path, sep='\t', index=False)
-            else:
-                raise ValueError(f" Unsupported format: {output_format}")
-
-            print(f"Saved extracted data to {output_path}")
-            extracted_files.append(output_path)
-        except Exception as e:
-            print(f" Failed to save {output_path}: {e}")
-
-   # print("\nAll files processed.")
-    return extracted_files
+    if current_account:
+        close_account()
+    yield from release()
+
+    for p in sorted(pages_seen - used_pages):
+        yield {"Page": p, "PAN": pan, "Name": name, "Score": score, "Field": "No Data", "Value": "No Data"}
+
+
+def save_records(rows, output_path, output_format='ods'):
+    """Write rows from extract_pdf() to output_path (a path or a writable binary file object); returns whether it was saved."""
+    output_label = getattr(output_path, "name", output_path)
+    df = pd.DataFrame(rows, columns=["Page", "PAN", "Name", "Score", "Field", "Value"])
+
+    try:
+        if output_format == 'xlsx':
+            df.to_excel(output_path, index=False)
+        elif output_format == 'ods':
+            df.to_excel(output_path, engine='odf', index=False)
+        elif output_format == 'txt':
+            df.to_csv(output_path, sep='\t', index=False)
+        else:
+            raise ValueError(f" Unsupported format: {output_format}")
+
+        print(f"Saved extracted data to {output_label}")
+        return True
+    except Exception as e:
+        print(f" Failed to save {output_label}: {e}")
+        return False
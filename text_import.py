@@ -5,6 +5,9 @@ import os
 import sys
 import requests
 
+# Raise when a change alters the output workbook, so reports are re-imported instead of served from the artifact cache
+STAGE_VERSION = 1
+
 
 # OneDrive Upload functions
 
@@ -85,32 +88,59 @@ def clean_str(val):
 
 def save_to_xlsx(df, out_path):
     df.to_excel(out_path, index=False, engine='openpyxl')
-    print(f"Saved output to {out_path}")
+    print(f"Saved output to {getattr(out_path, 'name', out_path)}")
 
 
 # Main 
 
-def main(input_path, output_dir=None, headers=None, user_email=None, remote_folder=None): 
+# input_path may also be an in-memory .ods (a BytesIO); the xlsx then goes to output_file, a writable binary file object
+def main(input_path, output_dir=None, headers=None, user_email=None, remote_folder=None, output_file=None): 
 #def main(input_path, output_dir=None):  # (modified for local)
-    if not os.path.isfile(input_path):
+    in_memory = hasattr(input_path, "read")
+    if not in_memory and not os.path.isfile(input_path):
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
-    output_path = get_output_path(input_path)
+    if output_file is not None:
+        output_path = output_file
+    else:
+        output_path = get_output_path(input_path)
+
+        if output_dir:
+            filename = os.path.basename(output_path)
+            output_path = os.path.join(output_dir, filename)
 
-    if output_dir:
-        filename = os.path.basename(output_path)
-        output_path = os.path.join(output_dir, filename)
+    if in_memory:
+        input_path.seek(0)
 
     # Read input ODS file
     doc = ezodf.opendoc(input_path)
     sheet = doc.sheets[0]
 
+    final_df = build_output([cell.value for cell in row] for row in sheet.rows())
+
+    save_to_xlsx(final_df, output_path)
+
+    # Upload to OneDrive if params provided
+    if headers and user_email and remote_folder:                     # (modified for local)
+        upload_file_to_onedrive(headers, user_email, output_path, remote_folder)
+
+    return output_path
+
+
+# Straight from text_extract.extract_pdf() rows to the output workbook, skipping the intermediate .ods
+def import_records(records, output_path):
+    rows = ([r["Page"], r["PAN"], r["Name"], r["Score"], r["Field"], r["Value"]] for r in records)
+    save_to_xlsx(build_output(rows), output_path)
+    return output_path
+
+
+# rows: [page, pan, name, score, field, value] lists as in the extract sheet (a header row is skipped)
+def build_output(rows):
     last_seen = {}
     last_field_per_page = {}
     data_rows = []
 
-    for row in sheet.rows():
-        values = [cell.value for cell in row]
+    for values in rows:
         if len(values) < 6:
             continue
         page, pan, name, score, field, value = values[:6]
@@ -249,14 +279,7 @@ def main(input_path, output_dir=None, headers=None, user_email=None, remote_fold
 
     final_df.sort_values(by="Page", inplace=True)
     final_df.fillna("No Data", inplace=True)
-
-    save_to_xlsx(final_df, output_path)
-
-    # Upload to OneDrive if params provided
-    if headers and user_email and remote_folder:                     # (modified for local)
-        upload_file_to_onedrive(headers, user_email, output_path, remote_folder)
-
-    return output_path
+    return final_df
 
 # CLI Execution
 
@@ -0,0 +1,247 @@
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import config
+
+HEARTBEAT_FILE = "heartbeat.json"
+
+
+def default_worker_id():
+    return config.WORKER_ID or socket.gethostname()
+
+
+def graph_timestamp(value):
+    """Seconds since the epoch for a Graph UTC timestamp such as 2024-05-01T10:15:30.123Z."""
+    return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+
+class WorkLeases:
+    """Base for the lease backends: claim() a file before processing it, then done() or release() it.
+
+    While started, a background thread heartbeats every LEASE_HEARTBEAT_INTERVAL seconds; claims of
+    an instance that stops heartbeating for LEASE_TTL seconds are handed back by reclaim_expired()
+    on any other instance.
+    """
+
+    def __init__(self, worker_id=None, ttl=None, heartbeat_interval=None):
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl or config.LEASE_TTL
+        self.heartbeat_interval = heartbeat_interval or config.LEASE_HEARTBEAT_INTERVAL
+        self._stop = threading.Event()
+        self._thread = None
+
+    def claim(self, item):
+        raise NotImplementedError
+
+    def done(self, item):
+        pass
+
+    def release(self, item):
+        raise NotImplementedError
+
+    def heartbeat(self):
+        raise NotImplementedError
+
+    def reclaim_expired(self):
+        raise NotImplementedError
+
+    def recover(self):
+        """Hand back whatever this worker still held from an earlier run or from jobs that were dropped."""
+        raise NotImplementedError
+
+    def start(self):
+        # Left over from a crash: give it back so the files are claimed (and resumed) like any other
+        self.recover()
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+        logging.info(f" Claiming work as {self.worker_id}")
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logging.warning(f" Lease heartbeat failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        try:
+            self.recover()
+        except Exception as e:
+            logging.warning(f" Could not hand back claimed files: {e}")
+
+
+class OneDriveLeases(WorkLeases):
+    """Claims a file by moving it into "In Progress/<worker id>" with If-Match on its listed eTag.
+
+    When instances race for the same file only one move succeeds; the others get 412 because the
+    eTag changed. Each worker folder holds a heartbeat file that is rewritten on every heartbeat,
+    and files in a folder whose heartbeat has gone stale are moved back to the source folder.
+    Ages are measured against the server's clock, taken from our own heartbeat, so clock skew
+    between hosts does not matter.
+    """
+
+    def __init__(self, headers, drive_id, worker_id=None, ttl=None, heartbeat_interval=None,
+                 source_folder=None, lease_root=None):
+        super().__init__(worker_id, ttl, heartbeat_interval)
+        # Resolved here rather than at import time: main.py loads its own copy of onedrive_utils
+        import onedrive_utils
+        self.od = onedrive_utils
+        self.headers = headers
+        self.drive_id = drive_id
+        self.source_folder = source_folder or onedrive_utils.TARGET_FOLDER_PATH
+        self.lease_root = lease_root or onedrive_utils.ONEDRIVE_IN_PROGRESS_FOLDER
+        self.worker_folder = f"{self.lease_root}/{self.worker_id}"
+        self._server_clock = None
+
+    def _move(self, item, folder_path, if_match=False):
+        folder_id = self.od.ensure_folder(self.headers, self.drive_id, folder_path)
+        headers = dict(self.headers or {})
+        if if_match and item.get("eTag"):
+            headers["If-Match"] = item["eTag"]
+        url = f"{self.od.GRAPH_URL}/drives/{self.drive_id}/items/{item['id']}"
+        return self.od.get_client().patch(url, headers=headers, json={"parentReference": {"id": folder_id}})
+
+    def _children(self, folder_path):
+        url = f"{self.od.GRAPH_URL}/drives/{self.drive_id}/root:/{quote(folder_path)}:/children"
+        try:
+            return self.od.get_all_pages(self.headers, url)
+        except self.od.requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return []
+            raise
+
+    def _server_now(self):
+        if self._server_clock is None:
+            return time.time()
+        server_time, measured_at = self._server_clock
+        return server_time + (time.monotonic() - measured_at)
+
+    def claim(self, item):
+        resp = self._move(item, self.worker_folder, if_match=True)
+        if resp.status_code in (404, 409, 412):
+            logging.info(f" {item.get('name')} was claimed by another worker")
+            return False
+        resp.raise_for_status()
+        return True
+
+    def release(self, item):
+        resp = self._move(item, self.source_folder)
+        if resp.status_code != 404:
+            resp.raise_for_status()
+
+    def heartbeat(self):
+        url = f"{self.od.GRAPH_URL}/drives/{self.drive_id}/root:/{quote(self.worker_folder)}/{HEARTBEAT_FILE}:/content"
+        body = json.dumps({"worker": self.worker_id, "ttl": self.ttl}).encode("utf-8")
+        self.od.ensure_folder(self.headers, self.drive_id, self.worker_folder)
+        resp = self.od.get_client().put(url, headers=self.headers, data=body)
+        resp.raise_for_status()
+        modified = resp.json().get("lastModifiedDateTime")
+        if modified:
+            self._server_clock = (graph_timestamp(modified), time.monotonic())
+
+    def _held_files(self, children):
+        return [child for child in children if "file" in child and child.get("name") != HEARTBEAT_FILE]
+
+    def reclaim_expired(self):
+        now = self._server_now()
+        reclaimed = 0
+        for folder in self._children(self.lease_root):
+            if "folder" not in folder or folder["name"] == self.worker_id:
+                continue
+            children = self._children(f"{self.lease_root}/{folder['name']}")
+            beats = [child for child in children if child.get("name") == HEARTBEAT_FILE]
+            last_beat = graph_timestamp(beats[0]["lastModifiedDateTime"]) if beats else 0
+            if now - last_beat <= self.ttl:
+                continue
+            handed_back = 0
+            for item in self._held_files(children):
+                # If-Match: skip files the owner touched since we listed them (it came back to life)
+                if self._move(item, self.source_folder, if_match=True).ok:
+                    handed_back += 1
+            if handed_back:
+                logging.warning(f" Lease of {folder['name']} expired, handed back {handed_back} file(s)")
+            reclaimed += handed_back
+        return reclaimed
+
+    def recover(self):
+        for item in self._held_files(self._children(self.worker_folder)):
+            self.release(item)
+            logging.info(f" Handed back {item.get('name')}")
+
+
+class SqliteLeases(WorkLeases):
+    """Lease table in SQLite with the same interface, for tests or instances sharing one disk."""
+
+    def __init__(self, worker_id=None, ttl=None, heartbeat_interval=None, path=None):
+        super().__init__(worker_id, ttl, heartbeat_interval)
+        self.path = path or config.LEASE_DB_FILE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    key TEXT PRIMARY KEY,
+                    worker TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def claim(self, item):
+        now = time.time()
+        with self._lock, self._conn:
+            # Takes the row only if it is free, expired or already ours
+            self._conn.execute("""
+                INSERT INTO leases (key, worker, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET worker = excluded.worker, expires_at = excluded.expires_at
+                WHERE leases.expires_at < ? OR leases.worker = excluded.worker
+            """, (item["id"], self.worker_id, now + self.ttl, now))
+            owner = self._conn.execute("SELECT worker FROM leases WHERE key = ?", (item["id"],)).fetchone()[0]
+        return owner == self.worker_id
+
+    def done(self, item):
+        self.release(item)
+
+    def release(self, item):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND worker = ?", (item["id"], self.worker_id))
+
+    def heartbeat(self):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE leases SET expires_at = ? WHERE worker = ?", (time.time() + self.ttl, self.worker_id))
+
+    def reclaim_expired(self):
+        with self._lock, self._conn:
+            reclaimed = self._conn.execute("DELETE FROM leases WHERE expires_at < ?", (time.time(),)).rowcount
+        if reclaimed:
+            logging.warning(f" Released {reclaimed} expired lease(s)")
+        return reclaimed
+
+    def recover(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM leases WHERE worker = ?", (self.worker_id,))
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+
+def create_leases(headers, drive_id):
+    """The lease backend chosen by LEASE_BACKEND, or None when claiming is turned off."""
+    backend = config.LEASE_BACKEND.lower()
+    if backend == "onedrive":
+        return OneDriveLeases(headers, drive_id)
+    if backend == "sqlite":
+        return SqliteLeases()
+    return None
@@ -0,0 +1,172 @@
+import os
+import logging
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+
+# Heavy libraries and report modules every worker imports once at start-up instead of on every file
+WARM_IMPORTS = ("pdfplumber", "fitz", "pandas", "cibil_pdf_extract", "cibil_file_import", "text_extract", "text_import")
+
+
+def default_worker_count():
+    if config.MAX_WORKERS > 0:
+        return config.MAX_WORKERS
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def current_rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+# === Worker side ===
+def _init_worker(log_file, warm_imports):
+    root = logging.getLogger()
+    if log_file and not root.handlers:
+        logging.basicConfig(
+            filename=log_file,
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    for name in warm_imports:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logging.warning(f"[Worker {os.getpid()}] Could not preload {name}: {e}")
+
+
+def _run_task(fn, args):
+    result = fn(*args)
+    return result, os.getpid(), current_rss_mb()
+
+
+# === Pool ===
+class WorkerPool:
+    """Process pool that keeps the PDF libraries warm and recycles workers that have grown too large."""
+
+    def __init__(self, workers=None, max_files_per_worker=None, max_rss_mb=None, log_file=None,
+                 warm_imports=WARM_IMPORTS):
+        self.workers = workers or default_worker_count()
+        self.max_files_per_worker = config.WORKER_MAX_FILES if max_files_per_worker is None else max_files_per_worker
+        self.max_rss_mb = config.WORKER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self.log_file = log_file
+        self.warm_imports = tuple(warm_imports)
+        self._executor = None
+        self._files_per_pid = {}
+        self._recycle_pending = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # Recycling is done by swapping the whole executor rather than max_tasks_per_child,
+        # which can deadlock on 3.11 when a worker retires with tasks still queued
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.log_file, self.warm_imports)
+        )
+        self._files_per_pid = {}
+        self._recycle_pending = False
+        logging.info(f" Worker pool started with {self.workers} process(es)")
+
+    def warm_up(self):
+        """Start the worker processes now so they finish their imports while the caller does other work."""
+        with self._lock:
+            if self._executor is None:
+                self._start()
+            for _ in range(self.workers):
+                self._executor.submit(os.getpid)
+
+    def recycle(self):
+        with self._lock:
+            self._recycle_locked()
+
+    def _recycle_locked(self):
+        old = self._executor
+        self._start()
+        if old is not None:
+            # Queued work on the old pool still completes; its processes exit once it drains
+            old.shutdown(wait=False)
+            logging.info(" Worker pool recycled")
+
+    def _on_done(self, inner, outer, executor):
+        try:
+            result, pid, rss_mb = inner.result()
+        except BrokenProcessPool as e:
+            logging.error(f" Worker process died: {e}")
+            with self._lock:
+                if executor is self._executor:
+                    self._recycle_pending = True
+            outer.set_exception(e)
+            return
+        except BaseException as e:
+            outer.set_exception(e)
+            return
+        # Callbacks run on each executor's manager thread, concurrently with submit() and with each other
+        with self._lock:
+            # Stragglers from a pool that has already been recycled are not counted
+            if executor is self._executor:
+                files_done = self._files_per_pid.get(pid, 0) + 1
+                self._files_per_pid[pid] = files_done
+                reason = None
+                if self.max_rss_mb and rss_mb > self.max_rss_mb:
+                    reason = f"at {rss_mb:.0f} MB RSS (limit {self.max_rss_mb} MB)"
+                elif self.max_files_per_worker and files_done >= self.max_files_per_worker:
+                    reason = f"processed {files_done} files"
+                if reason and not self._recycle_pending:
+                    logging.info(f" Worker {pid} {reason}, recycling pool")
+                    self._recycle_pending = True
+        outer.set_result(result)
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._start()
+            elif self._recycle_pending:
+                self._recycle_locked()
+            try:
+                inner = self._executor.submit(_run_task, fn, args)
+            except BrokenProcessPool:
+                self._recycle_locked()
+                inner = self._executor.submit(_run_task, fn, args)
+            executor = self._executor
+        outer = Future()
+        inner.add_done_callback(lambda f: self._on_done(f, outer, executor))
+        return outer
+
+    def map_unordered(self, fn, jobs):
+        """Run fn(*job) for every job, yielding (job, result, error) as each one finishes."""
+        futures = {self.submit(fn, *job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                yield job, future.result(), None
+            except Exception as e:
+                yield job, None, e
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        # Outside the lock: shutting down waits for the manager thread, which runs _on_done
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()